@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import heapq
+
+# Partial state per group: count and sum of the non-null values, plus optional min/max
+# and the sum of squared deviations from the group mean ("m2") when variance is requested.
+# The sum is carried as a (sum, sum_error) double-double so that merging chunks in any order
+# gives the correctly rounded total, i.e. the same averages as one groupby over the whole file.
+OPTIONAL_STATS = ("min", "max", "var")
+
+def split_for_exact_sum(values):
+    # Splits values into high parts on a power-of-two grid coarse enough that summing all of
+    # them is exact, and the (tiny) remainders whose rounded sum only affects sum_error.
+    if len(values) == 0:
+        return values, np.zeros_like(values)
+    magnitude = max(values.max(), -values.min())
+    if not np.isfinite(magnitude):
+        # NaN/inf present: fall back to masking them out (they pass through in the high part)
+        finite = np.isfinite(values)
+        magnitude = np.abs(values[finite]).max() if finite.any() else 0.0
+        if magnitude == 0.0:
+            return values, np.zeros_like(values)
+        grid = 2.0 ** (np.ceil(np.log2(magnitude * len(values))) - 52)
+        high = np.where(finite, np.rint(values / grid) * grid, values)
+        low = np.where(finite, values - high, 0.0)
+        return high, low
+    if magnitude == 0.0:
+        return values, np.zeros_like(values)
+
+    # Power-of-two grid, so scaling by its inverse is exact; done in place to keep it to a few passes
+    grid = 2.0 ** (np.ceil(np.log2(magnitude * len(values))) - 52)
+    high = np.multiply(values, 1.0 / grid)
+    np.rint(high, out=high)
+    high *= grid
+    low = np.subtract(values, high)
+    return high, low
+
+def compensated_add(sum_a, error_a, sum_b, error_b):
+    # Vectorized TwoSum (Knuth): the first result holds the rounded sum, the second what rounding dropped
+    total = sum_a + sum_b
+    b_virtual = total - sum_a
+    error = (sum_a - (total - b_virtual)) + (sum_b - b_virtual) + error_a + error_b
+    renormalized = total + error
+    return renormalized, error - (renormalized - total)
+
+def partial_aggregate(df, by='Country', column='Rating', stats=()):
+    unknown = set(stats) - set(OPTIONAL_STATS)
+    if unknown:
+        raise ValueError(f"Unsupported stats: {sorted(unknown)}. Choose from {OPTIONAL_STATS}.")
+
+    grouped = df.groupby(by, observed=True)[column]
+    high, low = split_for_exact_sum(df[column].to_numpy(dtype='float64', na_value=np.nan))
+    parts = pd.DataFrame({'high': high, 'low': low}, index=df.index).groupby(df[by], observed=True).sum()
+
+    state = pd.DataFrame({'count': grouped.count()})
+    state['sum'], state['sum_error'] = compensated_add(parts['high'], 0.0, parts['low'], 0.0)
+    if 'min' in stats:
+        state['min'] = grouped.min()
+    if 'max' in stats:
+        state['max'] = grouped.max()
+    if 'var' in stats:
+        state['m2'] = grouped.var(ddof=0) * state['count']
+
+    # Plain (non-categorical) keys so that states built from different chunks align on merge
+    if isinstance(state.index, pd.CategoricalIndex):
+        state.index = state.index.astype(state.index.categories.dtype)
+    return state
+
+def merge_partials(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+
+    left, right = left.align(right, join='outer')
+    left_count = left['count'].fillna(0)
+    right_count = right['count'].fillna(0)
+
+    merged = pd.DataFrame(index=left.index)
+    merged['count'] = (left_count + right_count).astype('int64')
+    merged['sum'], merged['sum_error'] = compensated_add(
+        left['sum'].fillna(0.0), left['sum_error'].fillna(0.0),
+        right['sum'].fillna(0.0), right['sum_error'].fillna(0.0),
+    )
+    if 'min' in left:
+        merged['min'] = pd.concat([left['min'], right['min']], axis=1).min(axis=1)
+    if 'max' in left:
+        merged['max'] = pd.concat([left['max'], right['max']], axis=1).max(axis=1)
+    if 'm2' in left:
+        # Chan et al. parallel variance update
+        delta = (right['sum'] / right_count - left['sum'] / left_count).fillna(0.0)
+        total = merged['count'].where(merged['count'] > 0)
+        merged['m2'] = (
+            left['m2'].fillna(0.0)
+            + right['m2'].fillna(0.0)
+            + (delta ** 2 * left_count * right_count / total).fillna(0.0)
+        )
+    return merged.sort_index()
+
+def update_state(state, df, by='Country', column='Rating', stats=()):
+    return merge_partials(state, partial_aggregate(df, by=by, column=column, stats=stats))
+
+def empty_state(by='Country'):
+    # State of an input without rows, e.g. a header-only blob
+    return pd.DataFrame({
+        'count': pd.Series(dtype='int64'),
+        'sum': pd.Series(dtype='float64'),
+        'sum_error': pd.Series(dtype='float64'),
+    }, index=pd.Index([], dtype='object', name=by))
+
+def merge_all(states):
+    merged = None
+    for state in states:
+        merged = merge_partials(merged, state)
+    return merged
+
+def aggregate_chunks(chunks, by='Country', column='Rating', stats=()):
+    state = None
+    for chunk in chunks:
+        state = update_state(state, chunk, by=by, column=column, stats=stats)
+    return state
+
+def finalize_average(state, by='Country'):
+    # Same layout as aggregate_data: one row per group sorted by key, RangeIndex
+    count = state['count'].where(state['count'] > 0)
+    result = pd.DataFrame({'average_rating': (state['sum'] + state['sum_error']) / count}, index=state.index)
+    if 'min' in state:
+        result['min_rating'] = state['min']
+    if 'max' in state:
+        result['max_rating'] = state['max']
+    if 'm2' in state:
+        result['var_rating'] = state['m2'] / (count - 1).where(count > 1)
+    result.index.name = by
+    return result.sort_index().reset_index()
+
+def aggregate_data_chunked(chunks, by='Country'):
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Country;
+    return finalize_average(aggregate_chunks(chunks, by=by), by=by)
+
+def top_n_from_state(state, n_top, by='Country'):
+    # Bounded heap over the group averages instead of sorting every group. Ties keep key order
+    # and the index is the group's position in the sorted aggregate, exactly like
+    # aggregate_data(df).nlargest(n_top, 'average_rating').
+    state = state.sort_index()
+    averages = (state['sum'] + state['sum_error']) / state['count'].where(state['count'] > 0)
+    candidates = ((position, average) for position, average in enumerate(averages.to_numpy()) if average == average)
+    top = heapq.nlargest(n_top, candidates, key=lambda candidate: candidate[1])
+
+    positions = [position for position, _ in top]
+    return pd.DataFrame(
+        {by: state.index[positions], 'average_rating': [average for _, average in top]},
+        index=positions,
+    )
+
+def aggregate_and_get_top_chunked(chunks, n_top, by='Country'):
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Country
+    # ORDER BY average_rating DESC LIMIT 3;
+    return top_n_from_state(aggregate_chunks(chunks, by=by), n_top, by=by)
+
+def aggregate_top_n(chunks, n_values=(3,), by=('Country', 'Category', 'Location')):
+    # One pass over the chunks answers every (group key, N) combination: each key keeps its own
+    # partial state, and the top-N for the largest N already contains every smaller N as a prefix.
+    states = dict.fromkeys(by)
+    for chunk in chunks:
+        for key in by:
+            states[key] = update_state(states[key], chunk, by=key)
+
+    results = {}
+    for key, state in states.items():
+        top = top_n_from_state(state, max(n_values), by=key)
+        for n_top in n_values:
+            results[(key, n_top)] = top.iloc[:n_top]
+    return results
\ No newline at end of file
@@ -0,0 +1,138 @@
+from azure.core.exceptions import ResourceExistsError
+from azure.core.pipeline.transport import RequestsTransport
+from azure.identity import DefaultAzureCredential
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+from azure.storage.blob import BlobServiceClient
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+import requests
+import contextlib
+import functools
+import os
+
+# Connections kept alive per host and shared by every blob request of the process
+CONNECTION_POOL_SIZE = int(os.environ.get('data_engineer_test_connection_pool_size', '32'))
+CONNECTION_TIMEOUT = 20
+READ_TIMEOUT = 300
+
+# Set to "1" to skip the exists() pre-flight checks and rely on the 404 of the real request instead
+SKIP_EXISTS_CHECKS = os.environ.get('data_engineer_test_skip_exists_checks', '0') == '1'
+
+@functools.lru_cache(maxsize=None)
+def get_credential():
+    # Built on first use. The credential caches access tokens in memory and refreshes them
+    # shortly before they expire, so sharing one instance also shares the token cache.
+    return DefaultAzureCredential()
+
+# Replaces the real client, e.g. with fake_blob_storage.FakeBlobServiceClient in benchmark.py
+blob_service_client_override = None
+
+def set_blob_service_client(client):
+    global blob_service_client_override
+    blob_service_client_override = client
+
+def get_blob_service_client_override():
+    # Spawned worker processes start without it; pass it to their initializer
+    return blob_service_client_override
+
+def get_blob_service_client():
+    if blob_service_client_override is not None:
+        return blob_service_client_override
+    return build_blob_service_client()
+
+@functools.lru_cache(maxsize=None)
+def build_blob_service_client():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=CONNECTION_POOL_SIZE, pool_maxsize=CONNECTION_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    transport = RequestsTransport(session=session, session_owner=False, connection_timeout=CONNECTION_TIMEOUT, read_timeout=READ_TIMEOUT)
+
+    # A connection string (e.g. "UseDevelopmentStorage=true" for Azurite) takes precedence over the account name
+    connection_string = os.environ.get('data_engineer_test_storage_connection_string')
+    if connection_string:
+        return BlobServiceClient.from_connection_string(connection_string, transport=transport)
+
+    account_name = os.environ['data_engineer_test_storage_account']
+    return BlobServiceClient(account_url=f"https://{account_name}.blob.core.windows.net", credential=get_credential(), transport=transport)
+
+# Replaces the real LogsQueryClient, e.g. with fake_logs_query.FakeLogsQueryClient
+logs_query_client_override = None
+
+def set_logs_query_client(client):
+    global logs_query_client_override
+    logs_query_client_override = client
+
+def get_logs_query_client():
+    if logs_query_client_override is not None:
+        return logs_query_client_override
+    return build_logs_query_client()
+
+@functools.lru_cache(maxsize=None)
+def build_logs_query_client():
+    # Imported here: only log_export.py needs azure-monitor-query
+    from azure.monitor.query import LogsQueryClient
+    return LogsQueryClient(get_credential())
+
+# Replaces the async client, e.g. with fake_blob_storage.AsyncFakeBlobServiceClient. It is entered
+# with `async with` on every use, so it has to be reusable.
+async_blob_service_client_override = None
+
+def set_async_blob_service_client(client):
+    global async_blob_service_client_override
+    async_blob_service_client_override = client
+
+@contextlib.asynccontextmanager
+async def async_blob_service_client():
+    # Async clients are bound to the running event loop, so they are built per use and closed after
+    if async_blob_service_client_override is not None:
+        async with async_blob_service_client_override as client:
+            yield client
+        return
+
+    connection_string = os.environ.get('data_engineer_test_storage_connection_string')
+    if connection_string:
+        async with AsyncBlobServiceClient.from_connection_string(connection_string) as client:
+            yield client
+        return
+
+    account_name = os.environ['data_engineer_test_storage_account']
+    credential = AsyncDefaultAzureCredential()
+    async with credential, AsyncBlobServiceClient(account_url=f"https://{account_name}.blob.core.windows.net", credential=credential) as client:
+        yield client
+
+def get_blob_client(container_name, blob_name, check_exists=None):
+    if check_exists is None:
+        check_exists = not SKIP_EXISTS_CHECKS
+
+    container_client = get_blob_service_client().get_container_client(container_name)
+    if check_exists and not container_client.exists():
+        raise ValueError(f"Container '{container_name}' does not exist.")
+
+    blob_client = container_client.get_blob_client(blob_name)
+    if check_exists and not blob_client.exists():
+        raise ValueError(f"Blob '{blob_name}' does not exist in container '{container_name}'.")
+    return blob_client
+
+def not_found_error(error, container_name, blob_name):
+    # The ValueError the pre-flight checks would have raised, built from a 404 on the real request
+    if getattr(error, 'error_code', None) == 'ContainerNotFound':
+        return ValueError(f"Container '{container_name}' does not exist.")
+    return ValueError(f"Blob '{blob_name}' does not exist in container '{container_name}'.")
+
+def get_or_create_container_client(container_name, check_exists=None):
+    if check_exists is None:
+        check_exists = not SKIP_EXISTS_CHECKS
+
+    container_client = get_blob_service_client().get_container_client(container_name)
+    if check_exists:
+        if not container_client.exists():
+            container_client.create_container()
+        else:
+            print(f"Container '{container_name}' already exists.")
+    else:
+        # One round trip instead of exists() + create_container()
+        try:
+            container_client.create_container()
+        except ResourceExistsError:
+            print(f"Container '{container_name}' already exists.")
+    return container_client
\ No newline at end of file
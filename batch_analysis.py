@@ -0,0 +1,59 @@
+from azure_clients import async_blob_service_client
+from aggregation import merge_all, partial_aggregate, top_n_from_state
+from tourism_schema import aggregate_columns, read_tourism_csv
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import asyncio
+import io
+import os
+import traceback
+
+# Blobs downloaded and parsed at the same time; also bounds how many raw blobs sit in memory
+DEFAULT_MAX_CONCURRENCY = 16
+
+def parse_and_aggregate(data, by):
+    return partial_aggregate(read_tourism_csv(io.BytesIO(data), usecols=aggregate_columns(by)), by=by)
+
+async def aggregate_blob(container_client, blob_name, semaphore, executor, by):
+    async with semaphore:
+        try:
+            downloaded_object = await container_client.get_blob_client(blob_name).download_blob()
+            data = await downloaded_object.readall()
+            # Parsing is CPU-bound: hand it to the process pool so the event loop keeps downloading
+            return await asyncio.get_running_loop().run_in_executor(executor, parse_and_aggregate, data, by)
+        except Exception as e:
+            error_message = traceback.format_exc()
+            print(f"An error occurred while processing '{blob_name}':")
+            print(error_message)
+            # Logging in production
+            raise e
+
+async def batch_aggregate_async(container_name, prefix="", max_concurrency=DEFAULT_MAX_CONCURRENCY, by='Country', pool_size=None):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    with ProcessPoolExecutor(max_workers=pool_size or os.cpu_count(), mp_context=multiprocessing.get_context("spawn")) as executor:
+        async with async_blob_service_client() as service_client:
+            container_client = service_client.get_container_client(container_name)
+            blob_names = [blob.name async for blob in container_client.list_blobs(name_starts_with=prefix) if blob.name.endswith('.csv')]
+            if not blob_names:
+                raise ValueError(f"No CSV blobs under '{prefix}' in container '{container_name}'.")
+
+            print(f"Processing {len(blob_names)} blobs from '{container_name}/{prefix}'.")
+            partial_states = await asyncio.gather(
+                *(aggregate_blob(container_client, blob_name, semaphore, executor, by) for blob_name in blob_names)
+            )
+    return merge_all(partial_states)
+
+def batch_aggregate_and_get_top(container_name, prefix, n_top, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    # SQL Equivalent (over every blob under the prefix):
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Country
+    # ORDER BY average_rating DESC LIMIT 3;
+    state = asyncio.run(batch_aggregate_async(container_name, prefix=prefix, max_concurrency=max_concurrency))
+    return top_n_from_state(state, n_top)
+
+if __name__ == "__main__":
+    from load_analyze_write_upload import upload_dataframe_to_azure_storage
+
+    prefix = os.environ.get('data_engineer_test_batch_prefix', '')
+    top_countries = batch_aggregate_and_get_top(container_name="raw", prefix=prefix, n_top=3)
+    upload_dataframe_to_azure_storage(top_countries, container_name="anastasios-iliopoulos", blob_name="Anastasios-Iliopoulos/Anastasios-Iliopoulos-batch.csv")
\ No newline at end of file
@@ -0,0 +1,134 @@
+from azure_clients import get_or_create_container_client, set_blob_service_client
+from fake_blob_storage import FakeBlobServiceClient
+from instrumentation import peak_rss_bytes, reset_peak_rss
+from load_analyze_write_upload import aggregate_and_get_top, aggregate_data, load_blob, upload_to_azure_storage, write_to_csv
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# Synthetic data follows the schema of tourism_dataset.csv
+COUNTRIES = ['Australia', 'Brazil', 'China', 'Egypt', 'France', 'India', 'USA']
+CATEGORIES = ['Adventure', 'Beach', 'Cultural', 'Historical', 'Nature', 'Urban']
+LETTERS = np.frombuffer(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ", dtype='S1')
+GENERATE_BATCH_ROWS = 1000000
+DEFAULT_SIZES = [10000, 1000000]
+
+RAW_CONTAINER = "raw"
+RESULT_CONTAINER = "benchmark-results"
+
+def generate_tourism_csv(path, n_rows, seed=0):
+    # Written in batches so that 100M rows never have to fit in memory at once
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="") as file:
+        for start in range(0, n_rows, GENERATE_BATCH_ROWS):
+            size = min(GENERATE_BATCH_ROWS, n_rows - start)
+            locations = LETTERS[rng.integers(0, len(LETTERS), size=(size, 10))].view('S10').ravel().astype(str)
+            batch = pd.DataFrame({
+                'Location': locations,
+                'Country': np.array(COUNTRIES)[rng.integers(0, len(COUNTRIES), size)],
+                'Category': np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), size)],
+                'Visitors': rng.integers(1000, 1000000, size),
+                'Rating': np.round(rng.uniform(1, 5, size), 2),
+                'Revenue': np.round(rng.uniform(1000, 1000000, size), 2),
+                'Accommodation_Available': np.where(rng.random(size) < 0.5, 'Yes', 'No'),
+            })
+            batch.to_csv(file, index=False, header=(start == 0))
+    return path
+
+def measure(stage, fn, repeat, n_rows, n_bytes):
+    latencies = []
+    result = None
+    peak = 0
+    for _ in range(repeat):
+        reset_peak_rss()
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+        peak = max(peak, peak_rss_bytes())
+
+    median = float(np.median(latencies))
+    return result, {
+        'stage': stage,
+        'rows': n_rows,
+        'bytes': n_bytes,
+        'repeat': repeat,
+        'p50_s': median,
+        'p90_s': float(np.percentile(latencies, 90)),
+        'p99_s': float(np.percentile(latencies, 99)),
+        'rows_per_s': n_rows / median if median > 0 else None,
+        'mb_per_s': n_bytes / median / 1e6 if median > 0 and n_bytes else None,
+        'peak_rss_mb': peak / 1e6,
+    }
+
+def run_pipeline_benchmark(n_rows, work_dir, repeat):
+    blob_name = f"tourism_dataset_{n_rows}.csv"
+    local_path = generate_tourism_csv(os.path.join(work_dir, blob_name), n_rows)
+    n_bytes = os.path.getsize(local_path)
+    with open(local_path, "rb") as file:
+        get_or_create_container_client(RAW_CONTAINER).get_blob_client(blob_name).upload_blob(file, overwrite=True)
+
+    results = []
+    df, stats = measure("load_blob", lambda: load_blob(RAW_CONTAINER, blob_name), repeat, n_rows, n_bytes)
+    results.append(stats)
+    _, stats = measure("aggregate_data", lambda: aggregate_data(df), repeat, n_rows, 0)
+    results.append(stats)
+    top, stats = measure("aggregate_and_get_top", lambda: aggregate_and_get_top(df, 3), repeat, n_rows, 0)
+    results.append(stats)
+
+    # Write and upload the full frame, not just the 3-row result, so that these stages have measurable volume
+    output_path = os.path.join(work_dir, f"output_{n_rows}.csv")
+    _, stats = measure("write_to_csv", lambda: write_to_csv(df, output_path), repeat, n_rows, 0)
+    stats['bytes'] = os.path.getsize(output_path)
+    stats['mb_per_s'] = stats['bytes'] / stats['p50_s'] / 1e6
+    results.append(stats)
+    _, stats = measure(
+        "upload_to_azure_storage",
+        lambda: upload_to_azure_storage(RESULT_CONTAINER, f"output_{n_rows}.csv", output_path),
+        repeat, n_rows, os.path.getsize(output_path),
+    )
+    results.append(stats)
+    return results
+
+def print_results(results):
+    header = f"{'rows':>11} {'stage':<24} {'p50 s':>9} {'p90 s':>9} {'p99 s':>9} {'rows/s':>13} {'MB/s':>9} {'peak RSS MB':>12}"
+    print(header)
+    print("-" * len(header))
+    for stats in results:
+        mb_per_s = f"{stats['mb_per_s']:.1f}" if stats['bytes'] else "-"
+        rows_per_s = f"{stats['rows_per_s']:.0f}" if stats['rows_per_s'] else "-"
+        print(
+            f"{stats['rows']:>11} {stats['stage']:<24} {stats['p50_s']:>9.4f} {stats['p90_s']:>9.4f} {stats['p99_s']:>9.4f} "
+            f"{rows_per_s:>13} {mb_per_s:>9} {stats['peak_rss_mb']:>12.1f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark load -> aggregate -> write -> upload on synthetic tourism data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="rows per synthetic dataset, e.g. 10000 1000000 100000000")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage used for the latency percentiles")
+    parser.add_argument("--backend", choices=["fake", "azurite"], default="fake",
+                        help="fake: filesystem-backed blob storage; azurite: local emulator via data_engineer_test_storage_connection_string")
+    parser.add_argument("--work-dir", default=None, help="where synthetic files (and the fake storage) are kept")
+    parser.add_argument("--output", default=None, help="also write the results as JSON lines to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        work_dir = args.work_dir or tmpdirname
+        os.makedirs(work_dir, exist_ok=True)
+        if args.backend == "fake":
+            set_blob_service_client(FakeBlobServiceClient(os.path.join(work_dir, "storage")))
+        else:
+            os.environ.setdefault('data_engineer_test_storage_connection_string', "UseDevelopmentStorage=true")
+
+        results = []
+        for n_rows in args.sizes:
+            results.extend(run_pipeline_benchmark(n_rows, work_dir, args.repeat))
+        print_results(results)
+
+        if args.output is not None:
+            with open(args.output, "w") as file:
+                for stats in results:
+                    file.write(json.dumps(stats) + "\n")
\ No newline at end of file
@@ -0,0 +1,114 @@
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError
+from azure_clients import get_blob_client, not_found_error
+from tourism_schema import read_tourism_csv
+import pandas as pd
+import hashlib
+import json
+import os
+import traceback
+
+# Local copies of blobs keyed by container/blob/ETag, evicted least recently used first
+CACHE_DIR = os.environ.get('data_engineer_test_cache_dir', os.path.join('.', '.blob_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('data_engineer_test_cache_max_bytes', str(2 * 1024 ** 3)))
+INDEX_FILE = 'index.json'
+
+def cache_key(container_name, blob_name, etag):
+    return hashlib.sha256(f"{container_name}/{blob_name}/{etag}".encode("utf-8")).hexdigest()
+
+def read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE), "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def write_index(cache_dir, index):
+    temp_path = os.path.join(cache_dir, f"{INDEX_FILE}.{os.getpid()}.tmp")
+    with open(temp_path, "w") as file:
+        json.dump(index, file)
+    os.replace(temp_path, os.path.join(cache_dir, INDEX_FILE))
+
+def evict(cache_dir, max_bytes, keep=()):
+    entries = {}
+    for name in os.listdir(cache_dir):
+        if name == INDEX_FILE or name.endswith('.tmp'):
+            continue
+        path = os.path.join(cache_dir, name)
+        stat = os.stat(path)
+        key = name.split('.')[0]
+        size, last_used = entries.get(key, (0, 0.0))
+        entries[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+
+    total = sum(size for size, _ in entries.values())
+    for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= max_bytes:
+            break
+        if key in keep:
+            continue
+        for suffix in ('.blob', '.pkl'):
+            path = os.path.join(cache_dir, key + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
+
+def cached_blob_path(container_name, blob_name, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    # Returns (local path, ETag) of the current blob content. When a copy is cached, the request
+    # is conditional (If-None-Match) and a 304 means nothing is transferred.
+    os.makedirs(cache_dir, exist_ok=True)
+    index = read_index(cache_dir)
+    known_etag = index.get(f"{container_name}/{blob_name}")
+    known_path = None
+    if known_etag is not None:
+        known_path = os.path.join(cache_dir, cache_key(container_name, blob_name, known_etag) + '.blob')
+
+    blob_client = get_blob_client(container_name, blob_name, check_exists=False)
+    try:
+        if known_path is not None and os.path.isfile(known_path):
+            downloaded_object = blob_client.download_blob(etag=known_etag, match_condition=MatchConditions.IfModified)
+        else:
+            downloaded_object = blob_client.download_blob()
+
+        etag = downloaded_object.properties.etag
+        key = cache_key(container_name, blob_name, etag)
+        path = os.path.join(cache_dir, key + '.blob')
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            downloaded_object.readinto(file)
+        os.replace(temp_path, path)
+    except ResourceNotModifiedError:
+        os.utime(known_path)
+        return known_path, known_etag
+    except ResourceNotFoundError as e:
+        raise not_found_error(e, container_name, blob_name) from e
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+    index[f"{container_name}/{blob_name}"] = etag
+    write_index(cache_dir, index)
+    evict(cache_dir, max_bytes, keep=(key,))
+    print(f"Blob '{blob_name}' cached at {path}")
+    return path, etag
+
+def load_blob_bytes_cached(container_name, blob_name, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    path, _ = cached_blob_path(container_name, blob_name, cache_dir=cache_dir, max_bytes=max_bytes)
+    with open(path, "rb") as file:
+        return file.read()
+
+def load_blob_cached(container_name, blob_name, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, usecols=None):
+    # Like load_blob, but the parsed frame is cached next to the bytes so unchanged data is
+    # neither downloaded nor parsed again.
+    path, _ = cached_blob_path(container_name, blob_name, cache_dir=cache_dir, max_bytes=max_bytes)
+    frame_path = os.path.splitext(path)[0] + '.pkl'
+    if os.path.isfile(frame_path):
+        os.utime(frame_path)
+        df = pd.read_pickle(frame_path)
+    else:
+        df = read_tourism_csv(path)
+        df.to_pickle(frame_path)
+        evict(cache_dir, max_bytes, keep=(os.path.basename(os.path.splitext(path)[0]),))
+    return df if usecols is None else df[usecols]
\ No newline at end of file
@@ -0,0 +1,35 @@
+import io
+
+# Rows per DataFrame chunk yielded by the streaming loaders
+DEFAULT_CHUNKSIZE = 100000
+
+class ChunkStream(io.RawIOBase):
+    # Read-only file object over an iterator of byte chunks (e.g. StorageStreamDownloader.chunks()),
+    # so pd.read_csv can parse a blob while it is still being downloaded.
+    # If tee is given, every chunk is also written to it as it is consumed.
+    def __init__(self, chunks, tee=None):
+        self._chunks = iter(chunks)
+        self._tee = tee
+        self._current = memoryview(b"")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._position >= len(self._current):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            if self._tee is not None:
+                self._tee.write(chunk)
+            self._current = memoryview(chunk)
+            self._position = 0
+
+        size = min(len(buffer), len(self._current) - self._position)
+        buffer[:size] = self._current[self._position:self._position + size]
+        self._position += size
+        return size
+
+def open_chunk_stream(chunks, tee=None, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    return io.BufferedReader(ChunkStream(chunks, tee=tee), buffer_size=buffer_size)
\ No newline at end of file
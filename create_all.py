@@ -1,194 +1,283 @@
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.compute import ComputeManagementClient
-from azure.mgmt.resource import ResourceManagementClient
-import traceback
-import os
-
-SUBSCRIPTION_ID = os.environ['data_engineer_test_subscription_id']
-RESOURCE_GROUP = os.environ['data_engineer_test_resource_group']
-STORAGE_ACCOUNT = os.environ['data_engineer_test_storage_account']
-LOCATION = os.environ['data_engineer_test_location']
-VNET_NAME = os.environ['data_engineer_test_vnet_name']
-SUBNET_NAME = os.environ['data_engineer_test_subnet_name']
-VM_NAME = os.environ['data_engineer_test_vm_name']
-NIC_NAME = os.environ['data_engineer_test_nic_name']
-IP_CONFIG_NAME = os.environ['data_engineer_test_ip_config_name']
-IPNAME = os.environ['data_engineer_test_ip_name']
-OS_PROFILE_ADMIN_USERNAME = os.environ['data_engineer_test_os_profile_admin_username']
-OS_PROFILE_ADMIN_PASSWORD = os.environ['data_engineer_test_os_profile_admin_password']
-NSG_NAME = os.environ['data_engineer_test_nsg_name']
-
-credentials = DefaultAzureCredential()
-
-resource_client = ResourceManagementClient(credentials, SUBSCRIPTION_ID)
-network_client = NetworkManagementClient(credentials, SUBSCRIPTION_ID)
-compute_client = ComputeManagementClient(credentials, SUBSCRIPTION_ID)
-
-def create_vnet(location, resource_group_name, vnet_name):
-    try:
-        network_client.virtual_networks.begin_create_or_update(
-            resource_group_name, 
-            vnet_name, 
-            {
-                "location": location,
-                "address_space": {"address_prefixes": ["10.0.0.0/16"]},
-            }
-        ).result()
-        print(f"VNet {vnet_name} created successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-def create_nsg(resource_group_name, nsg_name, location):
-    nsg = None
-    try:
-        nsg = network_client.network_security_groups.begin_create_or_update(
-            resource_group_name,
-            nsg_name,
-            {
-                "location": location,
-                "security_rules": [
-                    {
-                        "name": "AllowSSH",
-                        "properties": {
-                            "Access": "Allow",
-                            "Priority": 3000,
-                            "protocol": "Tcp",
-                            "Direction": "Inbound",
-                            "SourcePortRange": "*",
-                            "DestinationAddressPrefix": "*",
-                            "SourceAddressPrefix": "*",
-                            "DestinationPortRange": "22",
-                        },
-                    }
-                ],
-            }
-        ).result()
-        print(f"NSG {nsg_name} created successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred while creating NSG:")
-        print(error_message)
-        # Logging in production
-        raise e
-    return nsg.id if nsg is not None else None
-
-def create_subnet(resource_group_name, vnet_name, subnet_name, nsg_id):
-    try:
-        network_client.subnets.begin_create_or_update(
-            resource_group_name, 
-            vnet_name, 
-            subnet_name, 
-            {
-                "address_prefix": "10.0.0.0/24",
-                "network_security_group": {
-                    "id": nsg_id
-                }
-            }
-        ).result()
-        print(f"Subnet {subnet_name} created successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-def create_public_ip(resource_group_name, location, ip_name):
-    public_ip = None
-    try:
-        public_ip = network_client.public_ip_addresses.begin_create_or_update(
-            resource_group_name,
-            ip_name,
-            {
-                "location": location,
-                "public_ip_allocation_method": "Dynamic", # or static
-            }
-        ).result()
-        print(f"Public IP {ip_name} created successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred while creating Public IP:")
-        print(error_message)
-        # Logging in production
-        raise e
-    return public_ip.id if public_ip is not None else None
-
-def create_nic(resource_group_name, vnet_name, subnet_name, location, ip_config_name, nic_name, public_ip_id):
-    nic = None
-    try:
-        nic = network_client.network_interfaces.begin_create_or_update(
-            resource_group_name, 
-            nic_name, 
-            {
-                "location": location,
-                "ip_configurations": [
-                    {
-                        "name": ip_config_name,
-                        "subnet": {
-                            "id": network_client.subnets.get(
-                                resource_group_name, vnet_name, subnet_name
-                            ).id
-                        },
-                        "public_ip_address": {
-                            "id": public_ip_id
-                        },
-                    }
-                ],
-            }
-        ).result()
-        print(f"NIC {nic_name} created successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-    return nic.id if nic is not None else None
-
-def create_vm(vm_name, admin_username, admin_password, resource_group_name, nic_id, location):
-    try:
-        compute_client.virtual_machines.begin_create_or_update(
-            resource_group_name, 
-            vm_name, 
-            {
-                "location": location,
-                "hardware_profile": {"vm_size": "Standard_DS1_v2"},
-                "storage_profile": {
-                    "image_reference": {
-                        "publisher": "Canonical",
-                        "offer": "UbuntuServer",
-                        "sku": "18.04-LTS",
-                        "version": "latest",
-                    }
-                },
-                "os_profile": {
-                    "computer_name": vm_name,
-                    "admin_username": admin_username,
-                    "admin_password": admin_password,
-                },
-                "network_profile": {
-                    "network_interfaces": [{"id": nic_id}],
-                },
-            }
-        ).result()
-        print(f"VM {vm_name} created successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-    
-if __name__ == "__main__":
-    create_vnet(LOCATION, RESOURCE_GROUP, VNET_NAME)
-    nsg_id = create_nsg(RESOURCE_GROUP, NSG_NAME, LOCATION)
-    create_subnet(RESOURCE_GROUP, VNET_NAME, SUBNET_NAME, nsg_id)
-    ip_id = create_public_ip(RESOURCE_GROUP, LOCATION, IPNAME)
-    nic_id = create_nic(RESOURCE_GROUP, VNET_NAME, SUBNET_NAME, LOCATION, IP_CONFIG_NAME, NIC_NAME, ip_id)
-    create_vm(VM_NAME, OS_PROFILE_ADMIN_USERNAME, OS_PROFILE_ADMIN_PASSWORD, RESOURCE_GROUP, nic_id, LOCATION)
+from azure.identity import DefaultAzureCredential
+from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.compute import ComputeManagementClient
+from azure.mgmt.resource import ResourceManagementClient
+from dag_executor import run_dag
+from instrumentation import instrumented
+from provisioning_state import cached_resource_id, record
+import base64
+import traceback
+import os
+
+SUBSCRIPTION_ID = os.environ['data_engineer_test_subscription_id']
+RESOURCE_GROUP = os.environ['data_engineer_test_resource_group']
+STORAGE_ACCOUNT = os.environ['data_engineer_test_storage_account']
+LOCATION = os.environ['data_engineer_test_location']
+VNET_NAME = os.environ['data_engineer_test_vnet_name']
+SUBNET_NAME = os.environ['data_engineer_test_subnet_name']
+VM_NAME = os.environ['data_engineer_test_vm_name']
+NIC_NAME = os.environ['data_engineer_test_nic_name']
+IP_CONFIG_NAME = os.environ['data_engineer_test_ip_config_name']
+IPNAME = os.environ['data_engineer_test_ip_name']
+OS_PROFILE_ADMIN_USERNAME = os.environ['data_engineer_test_os_profile_admin_username']
+OS_PROFILE_ADMIN_PASSWORD = os.environ['data_engineer_test_os_profile_admin_password']
+NSG_NAME = os.environ['data_engineer_test_nsg_name']
+
+credentials = DefaultAzureCredential()
+
+resource_client = ResourceManagementClient(credentials, SUBSCRIPTION_ID)
+network_client = NetworkManagementClient(credentials, SUBSCRIPTION_ID)
+compute_client = ComputeManagementClient(credentials, SUBSCRIPTION_ID)
+
+@instrumented()
+def create_vnet(location, resource_group_name, vnet_name):
+    parameters = {
+        "location": location,
+        "address_space": {"address_prefixes": ["10.0.0.0/16"]},
+    }
+    vnet_id = cached_resource_id('vnet', resource_group_name, vnet_name, parameters,
+                                 lambda: network_client.virtual_networks.get(resource_group_name, vnet_name))
+    if vnet_id is not None:
+        print(f"VNet {vnet_name} is up to date, skipped.")
+        return vnet_id
+
+    vnet = None
+    try:
+        vnet = network_client.virtual_networks.begin_create_or_update(
+            resource_group_name, 
+            vnet_name, 
+            parameters
+        ).result()
+        record('vnet', resource_group_name, vnet_name, parameters, vnet.id)
+        print(f"VNet {vnet_name} created successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return vnet.id if vnet is not None else None
+
+@instrumented()
+def create_nsg(resource_group_name, nsg_name, location):
+    parameters = {
+        "location": location,
+        "security_rules": [
+            {
+                "name": "AllowSSH",
+                "properties": {
+                    "Access": "Allow",
+                    "Priority": 3000,
+                    "protocol": "Tcp",
+                    "Direction": "Inbound",
+                    "SourcePortRange": "*",
+                    "DestinationAddressPrefix": "*",
+                    "SourceAddressPrefix": "*",
+                    "DestinationPortRange": "22",
+                },
+            }
+        ],
+    }
+    nsg_id = cached_resource_id('nsg', resource_group_name, nsg_name, parameters,
+                                lambda: network_client.network_security_groups.get(resource_group_name, nsg_name))
+    if nsg_id is not None:
+        print(f"NSG {nsg_name} is up to date, skipped.")
+        return nsg_id
+
+    nsg = None
+    try:
+        nsg = network_client.network_security_groups.begin_create_or_update(
+            resource_group_name,
+            nsg_name,
+            parameters
+        ).result()
+        record('nsg', resource_group_name, nsg_name, parameters, nsg.id)
+        print(f"NSG {nsg_name} created successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred while creating NSG:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return nsg.id if nsg is not None else None
+
+@instrumented()
+def create_subnet(resource_group_name, vnet_name, subnet_name, nsg_id):
+    parameters = {
+        "address_prefix": "10.0.0.0/24",
+        "network_security_group": {
+            "id": nsg_id
+        }
+    }
+    subnet_id = cached_resource_id('subnet', resource_group_name, f"{vnet_name}/{subnet_name}", parameters,
+                                   lambda: network_client.subnets.get(resource_group_name, vnet_name, subnet_name))
+    if subnet_id is not None:
+        print(f"Subnet {subnet_name} is up to date, skipped.")
+        return subnet_id
+
+    subnet = None
+    try:
+        subnet = network_client.subnets.begin_create_or_update(
+            resource_group_name, 
+            vnet_name, 
+            subnet_name, 
+            parameters
+        ).result()
+        record('subnet', resource_group_name, f"{vnet_name}/{subnet_name}", parameters, subnet.id)
+        print(f"Subnet {subnet_name} created successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return subnet.id if subnet is not None else None
+
+@instrumented()
+def create_public_ip(resource_group_name, location, ip_name):
+    parameters = {
+        "location": location,
+        "public_ip_allocation_method": "Dynamic", # or static
+    }
+    public_ip_id = cached_resource_id('public_ip', resource_group_name, ip_name, parameters,
+                                      lambda: network_client.public_ip_addresses.get(resource_group_name, ip_name))
+    if public_ip_id is not None:
+        print(f"Public IP {ip_name} is up to date, skipped.")
+        return public_ip_id
+
+    public_ip = None
+    try:
+        public_ip = network_client.public_ip_addresses.begin_create_or_update(
+            resource_group_name,
+            ip_name,
+            parameters
+        ).result()
+        record('public_ip', resource_group_name, ip_name, parameters, public_ip.id)
+        print(f"Public IP {ip_name} created successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred while creating Public IP:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return public_ip.id if public_ip is not None else None
+
+@instrumented()
+def create_nic(resource_group_name, vnet_name, subnet_name, location, ip_config_name, nic_name, public_ip_id, subnet_id=None):
+    # The subnet is identified by name in the config hash, so an unchanged NIC is skipped
+    # without resolving its id; pass subnet_id (e.g. from create_subnet) to also save the GET on create.
+    config = {
+        "location": location,
+        "vnet_name": vnet_name,
+        "subnet_name": subnet_name,
+        "ip_config_name": ip_config_name,
+        "public_ip_id": public_ip_id,
+    }
+    nic_id = cached_resource_id('nic', resource_group_name, nic_name, config,
+                                lambda: network_client.network_interfaces.get(resource_group_name, nic_name))
+    if nic_id is not None:
+        print(f"NIC {nic_name} is up to date, skipped.")
+        return nic_id
+
+    nic = None
+    try:
+        if subnet_id is None:
+            subnet_id = network_client.subnets.get(resource_group_name, vnet_name, subnet_name).id
+        nic = network_client.network_interfaces.begin_create_or_update(
+            resource_group_name, 
+            nic_name, 
+            {
+                "location": location,
+                "ip_configurations": [
+                    {
+                        "name": ip_config_name,
+                        "subnet": {
+                            "id": subnet_id
+                        },
+                        "public_ip_address": {
+                            "id": public_ip_id
+                        },
+                    }
+                ],
+            }
+        ).result()
+        record('nic', resource_group_name, nic_name, config, nic.id)
+        print(f"NIC {nic_name} created successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return nic.id if nic is not None else None
+
+@instrumented()
+def create_vm(vm_name, admin_username, admin_password, resource_group_name, nic_id, location,
+              image_reference=None, system_assigned_identity=False, custom_data=None):
+    # custom_data: cloud-init script run once on the first boot (e.g. to install the repository)
+    parameters = {
+        "location": location,
+        "hardware_profile": {"vm_size": "Standard_DS1_v2"},
+        "storage_profile": {
+            "image_reference": image_reference or {
+                "publisher": "Canonical",
+                "offer": "UbuntuServer",
+                "sku": "18.04-LTS",
+                "version": "latest",
+            }
+        },
+        "os_profile": {
+            "computer_name": vm_name,
+            "admin_username": admin_username,
+            "admin_password": admin_password,
+        },
+        "network_profile": {
+            "network_interfaces": [{"id": nic_id}],
+        },
+    }
+    if system_assigned_identity:
+        parameters["identity"] = {"type": "SystemAssigned"}
+    if custom_data is not None:
+        parameters["os_profile"]["custom_data"] = base64.b64encode(custom_data.encode()).decode()
+    # The password is left out of the recorded hash; it cannot be changed through an update anyway
+    config = {**parameters, "os_profile": {key: value for key, value in parameters["os_profile"].items() if key != "admin_password"}}
+    vm_id = cached_resource_id('vm', resource_group_name, vm_name, config,
+                               lambda: compute_client.virtual_machines.get(resource_group_name, vm_name))
+    if vm_id is not None:
+        print(f"VM {vm_name} is up to date, skipped.")
+        return vm_id
+
+    vm = None
+    try:
+        vm = compute_client.virtual_machines.begin_create_or_update(
+            resource_group_name, 
+            vm_name, 
+            parameters
+        ).result()
+        record('vm', resource_group_name, vm_name, config, vm.id)
+        print(f"VM {vm_name} created successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return vm.id if vm is not None else None
+
+def provision_all(max_workers=None):
+    # VNet, NSG and public IP are independent and are created concurrently; the subnet waits for
+    # the VNet and the NSG, the NIC for the subnet and the IP, the VM for the NIC.
+    # Total time is roughly VNet/NSG -> subnet -> NIC -> VM instead of the sum of all steps.
+    tasks = {
+        'vnet': (lambda: create_vnet(LOCATION, RESOURCE_GROUP, VNET_NAME), []),
+        'nsg': (lambda: create_nsg(RESOURCE_GROUP, NSG_NAME, LOCATION), []),
+        'public_ip': (lambda: create_public_ip(RESOURCE_GROUP, LOCATION, IPNAME), []),
+        'subnet': (lambda vnet_id, nsg_id: create_subnet(RESOURCE_GROUP, VNET_NAME, SUBNET_NAME, nsg_id), ['vnet', 'nsg']),
+        'nic': (lambda subnet_id, ip_id: create_nic(RESOURCE_GROUP, VNET_NAME, SUBNET_NAME, LOCATION, IP_CONFIG_NAME, NIC_NAME, ip_id, subnet_id=subnet_id), ['subnet', 'public_ip']),
+        'vm': (lambda nic_id: create_vm(VM_NAME, OS_PROFILE_ADMIN_USERNAME, OS_PROFILE_ADMIN_PASSWORD, RESOURCE_GROUP, nic_id, LOCATION), ['nic']),
+    }
+    return run_dag(tasks, max_workers=max_workers)
+    
+if __name__ == "__main__":
+    provision_all()
     print("All resources created successfully.")
\ No newline at end of file
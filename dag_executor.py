@@ -0,0 +1,54 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Runs a small dependency graph of blocking calls (e.g. Azure long-running operations) on threads.
+# tasks maps a name to (fn, [dependency names]); fn is called with the results of its dependencies,
+# in the listed order, as soon as all of them have finished.
+
+def check_dag(tasks):
+    for name, (_, dependencies) in tasks.items():
+        unknown = [dependency for dependency in dependencies if dependency not in tasks]
+        if unknown:
+            raise ValueError(f"Task '{name}' depends on unknown task(s): {', '.join(unknown)}")
+
+    # Kahn's algorithm: whatever cannot be ordered is part of a cycle
+    pending = {name: set(dependencies) for name, (_, dependencies) in tasks.items()}
+    while pending:
+        ready = [name for name, dependencies in pending.items() if not dependencies]
+        if not ready:
+            raise ValueError(f"Dependency cycle between tasks: {', '.join(sorted(pending))}")
+        for name in ready:
+            del pending[name]
+        for dependencies in pending.values():
+            dependencies.difference_update(ready)
+
+def run_dag(tasks, max_workers=None):
+    # Returns {name: result}. After the first failure nothing new is started, the tasks already
+    # running are waited for, and that first exception is raised.
+    check_dag(tasks)
+
+    results = {}
+    remaining = dict(tasks)
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(tasks), 1)) as executor:
+        while remaining or running:
+            if error is None:
+                for name, (fn, dependencies) in list(remaining.items()):
+                    if all(dependency in results for dependency in dependencies):
+                        running[executor.submit(fn, *[results[dependency] for dependency in dependencies])] = name
+                        del remaining[name]
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+
+    if error is not None:
+        raise error
+    return results
\ No newline at end of file
@@ -1,90 +1,134 @@
-import os
-import traceback
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.compute import ComputeManagementClient
-
-# configuration
-subscription_id = os.environ['data_engineer_test_subscription_id']
-resource_group_name = os.environ['data_engineer_test_resource_group']
-vnet_name = os.environ['data_engineer_test_vnet_name']
-subnet_name = os.environ['data_engineer_test_subnet_name']
-vm_name = os.environ['data_engineer_test_vm_name']
-nic_name = os.environ['data_engineer_test_nic_name']
-nsg_name = os.environ['data_engineer_test_nsg_name']
-location = os.environ['data_engineer_test_location']
-
-credential = DefaultAzureCredential()
-network_client = NetworkManagementClient(credential, subscription_id)
-compute_client = ComputeManagementClient(credential, subscription_id)
-
-def delete_vm(resource_group_name, vm_name):
-    try:
-        compute_client.virtual_machines.begin_delete(resource_group_name, vm_name).result()
-        print(f"VM {vm_name} deleted successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-def delete_nic(resource_group_name, nic_name):
-    try:
-        network_client.network_interfaces.begin_delete(resource_group_name, nic_name).result()
-        print(f"NIC {nic_name} deleted successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-def delete_subnet(resource_group_name, vnet_name, subnet_name):
-    try:
-        network_client.subnets.begin_delete(resource_group_name, vnet_name, subnet_name).result()
-        print(f"Subnet {subnet_name} deleted successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-def delete_nsg(resource_group_name, nsg_name):
-    try:
-        network_client.network_security_groups.begin_delete(resource_group_name, nsg_name).result()
-        print(f"NSG {nsg_name} deleted successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-def delete_vnet(resource_group_name, vnet_name):
-    try:
-        network_client.virtual_networks.begin_delete(resource_group_name, vnet_name).result()
-        print(f"VNet {vnet_name} deleted successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-def delete_all_resources():
-    try:
-        delete_vm(resource_group_name, vm_name)
-        delete_nic(resource_group_name, nic_name)
-        delete_subnet(resource_group_name, vnet_name, subnet_name)
-        delete_nsg(resource_group_name, nsg_name)
-        delete_vnet(resource_group_name, vnet_name)
-        
-        print("All resources deleted successfully.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
+import os
+import traceback
+from azure.identity import DefaultAzureCredential
+from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.compute import ComputeManagementClient
+from dag_executor import run_dag
+from provisioning_state import forget
+
+# configuration
+subscription_id = os.environ['data_engineer_test_subscription_id']
+resource_group_name = os.environ['data_engineer_test_resource_group']
+vnet_name = os.environ['data_engineer_test_vnet_name']
+subnet_name = os.environ['data_engineer_test_subnet_name']
+vm_name = os.environ['data_engineer_test_vm_name']
+nic_name = os.environ['data_engineer_test_nic_name']
+nsg_name = os.environ['data_engineer_test_nsg_name']
+location = os.environ['data_engineer_test_location']
+# Optional: the public IP is only deleted when its name is known
+ip_name = os.environ.get('data_engineer_test_ip_name')
+
+credential = DefaultAzureCredential()
+network_client = NetworkManagementClient(credential, subscription_id)
+compute_client = ComputeManagementClient(credential, subscription_id)
+
+def delete_vm(resource_group_name, vm_name):
+    try:
+        compute_client.virtual_machines.begin_delete(resource_group_name, vm_name).result()
+        forget('vm', resource_group_name, vm_name)
+        print(f"VM {vm_name} deleted successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def delete_nic(resource_group_name, nic_name):
+    try:
+        network_client.network_interfaces.begin_delete(resource_group_name, nic_name).result()
+        forget('nic', resource_group_name, nic_name)
+        print(f"NIC {nic_name} deleted successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def delete_subnet(resource_group_name, vnet_name, subnet_name):
+    try:
+        network_client.subnets.begin_delete(resource_group_name, vnet_name, subnet_name).result()
+        forget('subnet', resource_group_name, f"{vnet_name}/{subnet_name}")
+        print(f"Subnet {subnet_name} deleted successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def delete_nsg(resource_group_name, nsg_name):
+    try:
+        network_client.network_security_groups.begin_delete(resource_group_name, nsg_name).result()
+        forget('nsg', resource_group_name, nsg_name)
+        print(f"NSG {nsg_name} deleted successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def delete_vnet(resource_group_name, vnet_name):
+    try:
+        network_client.virtual_networks.begin_delete(resource_group_name, vnet_name).result()
+        forget('vnet', resource_group_name, vnet_name)
+        print(f"VNet {vnet_name} deleted successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def delete_public_ip(resource_group_name, ip_name):
+    try:
+        network_client.public_ip_addresses.begin_delete(resource_group_name, ip_name).result()
+        forget('public_ip', resource_group_name, ip_name)
+        print(f"Public IP {ip_name} deleted successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def teardown_tasks(vm_names, nic_names, ip_names=(), keep_network=False):
+    # VM i, NIC i and public IP i belong together. A NIC can only go once its VM is gone, an IP once
+    # its NIC is gone; the subnet waits for every NIC, the NSG and the VNet for the subnet.
+    # Everything else (all VMs of a fleet, the IPs of different NICs, NSG and VNet) runs concurrently.
+    tasks = {}
+    for i, (fleet_vm_name, fleet_nic_name) in enumerate(zip(vm_names, nic_names)):
+        tasks[f"vm:{fleet_vm_name}"] = (lambda name=fleet_vm_name: delete_vm(resource_group_name, name), [])
+        tasks[f"nic:{fleet_nic_name}"] = (lambda *_, name=fleet_nic_name: delete_nic(resource_group_name, name), [f"vm:{fleet_vm_name}"])
+        if i < len(ip_names) and ip_names[i] is not None:
+            tasks[f"ip:{ip_names[i]}"] = (lambda *_, name=ip_names[i]: delete_public_ip(resource_group_name, name), [f"nic:{fleet_nic_name}"])
+
+    if not keep_network:
+        nic_tasks = [f"nic:{fleet_nic_name}" for fleet_nic_name in nic_names]
+        tasks[f"subnet:{subnet_name}"] = (lambda *_: delete_subnet(resource_group_name, vnet_name, subnet_name), nic_tasks)
+        tasks[f"nsg:{nsg_name}"] = (lambda *_: delete_nsg(resource_group_name, nsg_name), [f"subnet:{subnet_name}"])
+        tasks[f"vnet:{vnet_name}"] = (lambda *_: delete_vnet(resource_group_name, vnet_name), [f"subnet:{subnet_name}"])
+    return tasks
+
+def delete_all_resources(vm_names=None, nic_names=None, ip_names=None, keep_network=False, max_workers=None):
+    # Defaults to the single VM/NIC/IP from the environment; pass lists to tear down a fleet.
+    # keep_network=True deletes only the machines (and their NICs/IPs) and leaves the VNet, subnet and NSG.
+    vm_names = [vm_name] if vm_names is None else list(vm_names)
+    nic_names = [nic_name] if nic_names is None else list(nic_names)
+    if ip_names is None:
+        ip_names = [ip_name] if ip_name is not None and len(nic_names) == 1 else []
+    if len(vm_names) != len(nic_names):
+        raise ValueError(f"Expected one NIC per VM, got {len(vm_names)} VMs and {len(nic_names)} NICs.")
+
+    try:
+        run_dag(teardown_tasks(vm_names, nic_names, list(ip_names), keep_network=keep_network), max_workers=max_workers)
+        
+        print("All resources deleted successfully.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
\ No newline at end of file
@@ -0,0 +1,134 @@
+from blob_stream import DEFAULT_CHUNKSIZE
+from instrumentation import annotate, stage
+from load_analyze_write_upload import load_blob_chunks, upload_to_azure_storage
+from tourism_schema import aggregate_columns
+from vectorized_aggregation import aggregate_metrics
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import tempfile
+import os
+
+# Grace-hash aggregation for keys with too many groups to hold in memory (e.g. Location, which is
+# nearly unique per row). Pass 1 routes every row of every chunk by a hash of its key to one of
+# `partitions` Arrow IPC files on local disk; pass 2 memory-maps one partition at a time and
+# aggregates it in memory. A key lives in exactly one partition, so each partition's groups are
+# final. Memory is one chunk in pass 1 and about one partition in pass 2; a partition larger than
+# the budget is split again with a different hash before it is aggregated.
+SPILL_DIR = os.environ.get('data_engineer_test_spill_dir')  # None: the system temp directory
+SPILL_PARTITIONS = int(os.environ.get('data_engineer_test_spill_partitions', '64'))
+# Memory allowed for aggregating one partition
+MEMORY_BUDGET = int(os.environ.get('data_engineer_test_spill_memory_mb', '256')) * 1024 * 1024
+# Working memory of the in-memory aggregation per byte of spilled data (codes, exact-sum buffers)
+AGGREGATION_OVERHEAD = 4
+# Re-partitioning stops here: it cannot split a single key that is larger than the budget
+MAX_SPILL_LEVELS = 3
+
+def hash_key(level):
+    # hash_pandas_object takes a 16-character key; a different one per level re-shuffles the keys
+    return f"spill-level-{level:04d}"
+
+def partition_ids(keys, partitions, level=0):
+    hashes = pd.util.hash_pandas_object(keys, index=False, hash_key=hash_key(level)).to_numpy()
+    return (hashes % np.uint64(partitions)).astype('int64')
+
+def to_spill_table(chunk, by, column):
+    # Plain key values: categoricals of different chunks do not share their codes
+    keys = chunk[by]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        keys = keys.astype(keys.cat.categories.dtype)
+    return pa.table({by: pa.array(keys, from_pandas=True), column: pa.array(chunk[column].to_numpy(dtype='float64', na_value=np.nan))})
+
+def spill(tables, directory, by, partitions, level=0):
+    # Appends every table's rows to the partition file of their key; returns the file paths
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, f"part-{partition:04d}.arrow") for partition in range(partitions)]
+    writers = [None] * partitions
+    try:
+        for table in tables:
+            keys = table.column(by).to_pandas()
+            ids = partition_ids(keys[keys.notna()], partitions, level)
+            table = table.filter(pa.array(keys.notna().to_numpy()))
+            # One stable sort by partition, then a zero-copy slice per partition
+            order = np.argsort(ids, kind='stable')
+            table = table.take(pa.array(order))
+            bounds = np.searchsorted(ids[order], np.arange(partitions + 1))
+            for partition in range(partitions):
+                if bounds[partition] == bounds[partition + 1]:
+                    continue
+                if writers[partition] is None:
+                    writers[partition] = ipc.new_file(paths[partition], table.schema)
+                writers[partition].write_table(table.slice(bounds[partition], bounds[partition + 1] - bounds[partition]))
+    finally:
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+    return [path for path, writer in zip(paths, writers) if writer is not None]
+
+def read_partition(path):
+    # Zero-copy: the record batches point into the memory-mapped file
+    with pa.memory_map(path, 'r') as source:
+        return ipc.open_file(source).read_all()
+
+def aggregate_partition(path, by, column, partitions, memory_budget, level):
+    # Yields the final groups of one partition file, splitting it again first if it is too big
+    if os.path.getsize(path) * AGGREGATION_OVERHEAD > memory_budget and level < MAX_SPILL_LEVELS:
+        with pa.memory_map(path, 'r') as source:
+            reader = ipc.open_file(source)
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+            sub_paths = spill((pa.Table.from_batches([batch]) for batch in batches), path + ".split", by, partitions, level + 1)
+        os.remove(path)
+        for sub_path in sub_paths:
+            yield from aggregate_partition(sub_path, by, column, partitions, memory_budget, level + 1)
+        return
+
+    with stage("external_partition"):
+        df = read_partition(path).to_pandas()
+        result = aggregate_metrics(df, by=[by], metrics={'average_rating': (column, 'mean')})
+        annotate(rows=len(df))
+    del df
+    os.remove(path)
+    yield result
+
+def external_aggregate_partitions(chunks, by='Location', column='Rating', partitions=SPILL_PARTITIONS,
+                                  memory_budget=MEMORY_BUDGET, spill_dir=SPILL_DIR):
+    # Yields aggregate_data-shaped frames, one per partition: sorted within a partition, not across
+    with tempfile.TemporaryDirectory(prefix="spill-", dir=spill_dir) as directory:
+        with stage("external_spill"):
+            paths = spill((to_spill_table(chunk, by, column) for chunk in chunks), directory, by, partitions)
+        for path in paths:
+            yield from aggregate_partition(path, by, column, partitions, memory_budget, 0)
+
+def external_aggregate_data(chunks, by='Location', column='Rating', partitions=SPILL_PARTITIONS,
+                            memory_budget=MEMORY_BUDGET, spill_dir=SPILL_DIR):
+    # SQL Equivalent:
+    # SELECT Location, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Location;
+    # Same output as aggregate_data (one row per group sorted by key). The result itself has one
+    # row per group, so for very many groups write external_aggregate_partitions out instead.
+    frames = list(external_aggregate_partitions(chunks, by=by, column=column, partitions=partitions,
+                                                memory_budget=memory_budget, spill_dir=spill_dir))
+    if not frames:
+        return pd.DataFrame({by: pd.Series(dtype='str'), 'average_rating': pd.Series(dtype='float64')})
+    return pd.concat(frames, ignore_index=True).sort_values(by, kind='stable', ignore_index=True)
+
+def write_external_aggregate_csv(chunks, save_local_path, by='Location', column='Rating'):
+    # Streams the partitions to one CSV, so neither the groups nor the result are held in memory
+    path = os.path.join(".", os.path.normpath(save_local_path))
+    rows = 0
+    with open(path, "w", newline="") as file:
+        for index, frame in enumerate(external_aggregate_partitions(chunks, by=by, column=column)):
+            frame.to_csv(file, index=False, header=index == 0)
+            rows += len(frame)
+        if rows == 0:
+            # No groups: still a CSV with the header, as upload_dataframe_to_azure_storage writes for an empty frame
+            pd.DataFrame(columns=[by, 'average_rating']).to_csv(file, index=False)
+    print(f"{rows} groups by {by} written to {path}")
+    return path
+
+if __name__ == "__main__":
+    # Average rating per Location, the high-cardinality variant of aggregate_data
+    chunks = load_blob_chunks(container_name="raw", blob_name="tourism_dataset.csv", chunksize=DEFAULT_CHUNKSIZE, usecols=aggregate_columns('Location'))
+    local_path = write_external_aggregate_csv(chunks, "./Anastasios-Iliopoulos-by-location.csv")
+    upload_to_azure_storage("anastasios-iliopoulos", "Anastasios-Iliopoulos/Anastasios-Iliopoulos-by-location.csv", local_path)
\ No newline at end of file
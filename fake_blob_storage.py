@@ -0,0 +1,186 @@
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError, ResourceNotModifiedError
+import hashlib
+import json
+import os
+import types
+
+# Filesystem-backed stand-in for the subset of azure.storage.blob used by the pipeline.
+# Containers are directories under `root`, blobs are files; metadata lives in a ".meta" sidecar.
+META_SUFFIX = '.meta'
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+class FakeStorageStreamDownloader:
+    def __init__(self, data, properties):
+        self.data = data
+        self.properties = properties
+        self.size = len(data)
+
+    def readall(self):
+        return self.data
+
+    def readinto(self, stream):
+        stream.write(self.data)
+        return len(self.data)
+
+    def chunks(self):
+        for start in range(0, len(self.data), DOWNLOAD_CHUNK_SIZE):
+            yield self.data[start:start + DOWNLOAD_CHUNK_SIZE]
+
+class FakeBlobClient:
+    def __init__(self, root, container_name, blob_name):
+        self.container_name = container_name
+        self.blob_name = blob_name
+        self.container_path = os.path.join(root, container_name)
+        self.path = os.path.join(self.container_path, blob_name)
+        self.staging_path = self.path + '.blocks'
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def get_blob_properties(self):
+        if not self.exists():
+            raise ResourceNotFoundError(f"Blob '{self.blob_name}' not found")
+        metadata = {}
+        if os.path.isfile(self.path + META_SUFFIX):
+            with open(self.path + META_SUFFIX, "r") as file:
+                metadata = json.load(file)
+        stat = os.stat(self.path)
+        # ETag from size and mtime, like a real ETag it changes on every write
+        etag = '"' + hashlib.md5(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest() + '"'
+        return types.SimpleNamespace(name=self.blob_name, size=stat.st_size, etag=etag, metadata=metadata, last_modified=stat.st_mtime)
+
+    def download_blob(self, offset=None, length=None, etag=None, match_condition=None, **kwargs):
+        properties = self.get_blob_properties()
+        if match_condition == MatchConditions.IfModified and etag == properties.etag:
+            raise ResourceNotModifiedError("Not modified")
+        with open(self.path, "rb") as file:
+            file.seek(offset or 0)
+            data = file.read() if length is None else file.read(length)
+        return FakeStorageStreamDownloader(data, properties)
+
+    def upload_blob(self, data, overwrite=False, metadata=None, **kwargs):
+        if not os.path.isdir(self.container_path):
+            raise ResourceNotFoundError("Container not found")
+        if self.exists() and not overwrite:
+            raise ResourceExistsError(f"Blob '{self.blob_name}' already exists")
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb") as file:
+            file.write(data)
+        with open(self.path + META_SUFFIX, "w") as file:
+            json.dump(metadata or {}, file)
+
+    def stage_block(self, block_id, data, **kwargs):
+        os.makedirs(self.staging_path, exist_ok=True)
+        with open(os.path.join(self.staging_path, block_id.replace('/', '_')), "wb") as file:
+            file.write(data)
+
+    def commit_block_list(self, block_list, metadata=None, **kwargs):
+        blocks = []
+        for block in block_list:
+            with open(os.path.join(self.staging_path, block.id.replace('/', '_')), "rb") as file:
+                blocks.append(file.read())
+        self.upload_blob(b"".join(blocks), overwrite=True, metadata=metadata)
+        for name in os.listdir(self.staging_path):
+            os.remove(os.path.join(self.staging_path, name))
+        os.rmdir(self.staging_path)
+
+    def delete_blob(self, **kwargs):
+        if not self.exists():
+            raise ResourceNotFoundError(f"Blob '{self.blob_name}' not found")
+        os.remove(self.path)
+        if os.path.isfile(self.path + META_SUFFIX):
+            os.remove(self.path + META_SUFFIX)
+
+class FakeContainerClient:
+    def __init__(self, root, container_name):
+        self.root = root
+        self.container_name = container_name
+        self.path = os.path.join(root, container_name)
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def create_container(self, **kwargs):
+        if self.exists():
+            raise ResourceExistsError(f"Container '{self.container_name}' already exists")
+        os.makedirs(self.path)
+
+    def get_blob_client(self, blob_name):
+        return FakeBlobClient(self.root, self.container_name, blob_name)
+
+    def list_blobs(self, name_starts_with=None, **kwargs):
+        if not self.exists():
+            raise ResourceNotFoundError(f"Container '{self.container_name}' not found")
+        names = []
+        for directory, _, files in os.walk(self.path):
+            for file_name in files:
+                if file_name.endswith(META_SUFFIX) or os.path.basename(directory).endswith('.blocks'):
+                    continue
+                name = os.path.relpath(os.path.join(directory, file_name), self.path).replace(os.sep, '/')
+                if name_starts_with is None or name.startswith(name_starts_with):
+                    names.append(name)
+        return [self.get_blob_client(name).get_blob_properties() for name in sorted(names)]
+
+class FakeBlobServiceClient:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def get_container_client(self, container_name):
+        return FakeContainerClient(self.root, container_name)
+
+    def get_blob_client(self, container, blob):
+        return FakeBlobClient(self.root, container, blob)
+
+# Async variants (azure.storage.blob.aio) over the same files, for batch_analysis.py. Calls are
+# plain file I/O run inline; entering the service client is a no-op, so one instance can be reused.
+class AsyncFakeStorageStreamDownloader:
+    def __init__(self, downloader):
+        self.downloader = downloader
+        self.size = downloader.size
+        self.properties = downloader.properties
+
+    async def readall(self):
+        return self.downloader.readall()
+
+class AsyncFakeBlobClient:
+    def __init__(self, blob_client):
+        self.blob_client = blob_client
+
+    async def get_blob_properties(self):
+        return self.blob_client.get_blob_properties()
+
+    async def download_blob(self, **kwargs):
+        return AsyncFakeStorageStreamDownloader(self.blob_client.download_blob(**kwargs))
+
+class AsyncFakeContainerClient:
+    def __init__(self, container_client):
+        self.container_client = container_client
+
+    def get_blob_client(self, blob_name):
+        return AsyncFakeBlobClient(self.container_client.get_blob_client(blob_name))
+
+    async def list_blobs(self, name_starts_with=None, **kwargs):
+        for blob in self.container_client.list_blobs(name_starts_with=name_starts_with):
+            yield blob
+
+class AsyncFakeBlobServiceClient:
+    def __init__(self, root):
+        self.client = FakeBlobServiceClient(root)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    def get_container_client(self, container_name):
+        return AsyncFakeContainerClient(self.client.get_container_client(container_name))
+
+    def get_blob_client(self, container, blob):
+        return AsyncFakeBlobClient(self.client.get_blob_client(container, blob))
\ No newline at end of file
@@ -0,0 +1,58 @@
+import threading
+import time
+
+# In-memory stand-in for azure.monitor.query.LogsQueryClient, serving one DataFrame of events.
+# The KQL is not interpreted: rows are selected by the `timespan` argument ([start, end) on the
+# time column). Like the service, a result over `max_rows` comes back partial and truncated.
+STATUS_SUCCESS = "Success"
+STATUS_PARTIAL = "PartialError"
+
+# pandas dtype kind -> Log Analytics column type
+COLUMN_TYPES = {'M': 'datetime', 'i': 'long', 'u': 'long', 'f': 'real', 'b': 'bool'}
+
+class FakeLogsTable:
+    def __init__(self, name, columns, columns_types, rows):
+        self.name = name
+        self.columns = columns
+        self.columns_types = columns_types
+        self.rows = rows
+
+class FakeLogsQueryResult:
+    def __init__(self, tables):
+        self.status = STATUS_SUCCESS
+        self.tables = tables
+
+class FakeLogsQueryPartialResult:
+    def __init__(self, partial_data, partial_error):
+        self.status = STATUS_PARTIAL
+        self.partial_data = partial_data
+        self.partial_error = partial_error
+
+class FakeLogsQueryClient:
+    def __init__(self, events, time_column='TimeGenerated', max_rows=500000, latency=0.0):
+        self.events = events.sort_values(time_column, kind='stable').reset_index(drop=True)
+        self.time_column = time_column
+        self.max_rows = max_rows
+        # Seconds per query, to see the effect of running slices concurrently
+        self.latency = latency
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def query_workspace(self, workspace_id, query, *, timespan, **kwargs):
+        start, end = timespan
+        with self.lock:
+            self.queries.append((start, end))
+        time.sleep(self.latency)
+
+        times = self.events[self.time_column]
+        selected = self.events[(times >= start) & (times < end)]
+        columns = list(selected.columns)
+        columns_types = [COLUMN_TYPES.get(selected[column].dtype.kind, 'string') for column in columns]
+        rows = [list(row) for row in selected.head(self.max_rows).astype(object).itertuples(index=False, name=None)]
+        for row in rows:
+            row[columns.index(self.time_column)] = row[columns.index(self.time_column)].to_pydatetime()
+        table = FakeLogsTable("PrimaryResult", columns, columns_types, rows)
+
+        if len(selected) > self.max_rows:
+            return FakeLogsQueryPartialResult([table], f"Query result exceeded {self.max_rows} rows and was truncated.")
+        return FakeLogsQueryResult([table])
\ No newline at end of file
@@ -0,0 +1,336 @@
+from azure_clients import get_blob_client, get_blob_service_client, set_blob_service_client
+from aggregation import aggregate_chunks, empty_state, merge_all, top_n_from_state
+from dag_executor import run_dag
+from load_analyze_write_upload import load_blob_chunks, upload_dataframe_to_azure_storage, upload_to_azure_storage, write_to_csv
+from parallel_analysis import aggregate_byte_range, split_byte_ranges
+from tourism_schema import AGGREGATE_COLUMNS
+from blob_stream import DEFAULT_CHUNKSIZE
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import io
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+import traceback
+import uuid
+
+# Scale-out mode: N worker VMs each aggregate one shard of the raw container and write their
+# partial state to RESULT_CONTAINER/partials/<run_id>/worker-<i>.csv; a reducer merges the partials.
+RESULT_CONTAINER = "anastasios-iliopoulos"
+PARTIALS_PREFIX = "partials/"
+# Where the repository (and its requirements) are installed on every worker VM. Absolute: the
+# bootstrap script and Run Command both run as root, whose home is not the admin user's.
+FLEET_REMOTE_DIR = os.environ.get('data_engineer_test_fleet_remote_dir', '/opt/dtu_data_engineer_test')
+# Git URL the bootstrap script clones onto provisioned workers
+FLEET_REPO_URL = os.environ.get('data_engineer_test_fleet_repo_url')
+# Worker image: the scripts need a newer Python 3 than the one of create_vm's Ubuntu 18.04 default
+FLEET_IMAGE = {
+    "publisher": "Canonical",
+    "offer": "0001-com-ubuntu-server-jammy",
+    "sku": "22_04-lts",
+    "version": "latest",
+}
+# Built-in role that lets the workers' managed identities read the raw blobs and write their partials
+STORAGE_BLOB_DATA_CONTRIBUTOR = "ba92f5b4-2d11-453d-a403-e96b0029c9fe"
+# Resource id of the storage account; by default the account of create_all.py in its resource group
+STORAGE_ACCOUNT_ID = os.environ.get('data_engineer_test_storage_account_id')
+# Run before every worker command: Run Command can start before cloud-init has finished the bootstrap
+FLEET_SETUP_COMMANDS = ["cloud-init status --wait > /dev/null"]
+
+def worker_resource_names(index):
+    # The base names come from the same environment variables as create_all.py
+    return (
+        f"{os.environ['data_engineer_test_vm_name']}-{index}",
+        f"{os.environ['data_engineer_test_nic_name']}-{index}",
+        f"{os.environ['data_engineer_test_ip_name']}-{index}",
+    )
+
+def bootstrap_script(repo_url, remote_dir=FLEET_REMOTE_DIR):
+    # cloud-init runs this once, as root, on the first boot of a worker VM
+    return "\n".join([
+        "#!/bin/bash",
+        "set -e",
+        "apt-get update",
+        "apt-get install -y git python3-pip",
+        f"git clone {shlex.quote(repo_url)} {shlex.quote(remote_dir)}",
+        f"python3 -m pip install -r {shlex.quote(remote_dir.rstrip('/') + '/requirements.txt')}",
+    ]) + "\n"
+
+def grant_storage_access(vm_name):
+    # Gives the VM's system-assigned identity Storage Blob Data Contributor on the storage account,
+    # which is what DefaultAzureCredential picks up on the worker. The assignment name is derived
+    # from scope, identity and role, so a re-run finds the existing assignment. A new assignment
+    # can take a few minutes to apply; until then the worker's requests are refused (403).
+    import create_all
+    from azure.core.exceptions import ResourceExistsError
+    from azure.mgmt.authorization import AuthorizationManagementClient
+
+    principal_id = create_all.compute_client.virtual_machines.get(create_all.RESOURCE_GROUP, vm_name).identity.principal_id
+    scope = STORAGE_ACCOUNT_ID or (
+        f"/subscriptions/{create_all.SUBSCRIPTION_ID}/resourceGroups/{create_all.RESOURCE_GROUP}"
+        f"/providers/Microsoft.Storage/storageAccounts/{create_all.STORAGE_ACCOUNT}"
+    )
+    assignment_name = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{scope}/{principal_id}/{STORAGE_BLOB_DATA_CONTRIBUTOR}"))
+    authorization_client = AuthorizationManagementClient(create_all.credentials, create_all.SUBSCRIPTION_ID)
+    try:
+        authorization_client.role_assignments.create(scope, assignment_name, {
+            "role_definition_id": f"/subscriptions/{create_all.SUBSCRIPTION_ID}/providers/Microsoft.Authorization/roleDefinitions/{STORAGE_BLOB_DATA_CONTRIBUTOR}",
+            "principal_id": principal_id,
+            # Set explicitly: a just-created identity may not have replicated yet
+            "principal_type": "ServicePrincipal",
+        })
+        print(f"Storage access granted to VM {vm_name}.")
+    except ResourceExistsError:
+        print(f"VM {vm_name} already has storage access, skipped.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return principal_id
+
+def provision_fleet(n_workers, custom_data=None, remote_dir=FLEET_REMOTE_DIR, max_workers=None):
+    # Workers share the VNet, subnet and NSG; every worker has its own public IP, NIC and VM.
+    # All workers are created concurrently once the subnet exists. Every VM gets a system-assigned
+    # identity with access to the storage account, and runs custom_data (by default
+    # bootstrap_script(FLEET_REPO_URL, remote_dir)) on its first boot to install the repository.
+    import create_all
+
+    if custom_data is None:
+        if FLEET_REPO_URL is None:
+            raise ValueError("Workers need the repository: set data_engineer_test_fleet_repo_url or pass custom_data.")
+        custom_data = bootstrap_script(FLEET_REPO_URL, remote_dir)
+
+    tasks = {
+        'vnet': (lambda: create_all.create_vnet(create_all.LOCATION, create_all.RESOURCE_GROUP, create_all.VNET_NAME), []),
+        'nsg': (lambda: create_all.create_nsg(create_all.RESOURCE_GROUP, create_all.NSG_NAME, create_all.LOCATION), []),
+        'subnet': (lambda vnet_id, nsg_id: create_all.create_subnet(create_all.RESOURCE_GROUP, create_all.VNET_NAME, create_all.SUBNET_NAME, nsg_id), ['vnet', 'nsg']),
+    }
+    for index in range(n_workers):
+        vm_name, nic_name, ip_name = worker_resource_names(index)
+        tasks[f"ip:{index}"] = (lambda ip_name=ip_name: create_all.create_public_ip(create_all.RESOURCE_GROUP, create_all.LOCATION, ip_name), [])
+        tasks[f"nic:{index}"] = (
+            lambda subnet_id, ip_id, nic_name=nic_name: create_all.create_nic(
+                create_all.RESOURCE_GROUP, create_all.VNET_NAME, create_all.SUBNET_NAME, create_all.LOCATION, create_all.IP_CONFIG_NAME, nic_name, ip_id, subnet_id=subnet_id
+            ),
+            ['subnet', f"ip:{index}"],
+        )
+        tasks[f"vm:{index}"] = (
+            lambda nic_id, vm_name=vm_name: create_all.create_vm(
+                vm_name, create_all.OS_PROFILE_ADMIN_USERNAME, create_all.OS_PROFILE_ADMIN_PASSWORD, create_all.RESOURCE_GROUP, nic_id, create_all.LOCATION,
+                image_reference=FLEET_IMAGE, system_assigned_identity=True, custom_data=custom_data,
+            ),
+            [f"nic:{index}"],
+        )
+        tasks[f"role:{index}"] = (lambda vm_id, vm_name=vm_name: grant_storage_access(vm_name), [f"vm:{index}"])
+    results = run_dag(tasks, max_workers=max_workers)
+    return [worker_resource_names(index)[0] for index in range(n_workers)], results
+
+def teardown_fleet(n_workers, keep_network=True, max_workers=None):
+    import delete_all
+
+    names = [worker_resource_names(index) for index in range(n_workers)]
+    delete_all.delete_all_resources(
+        vm_names=[vm_name for vm_name, _, _ in names],
+        nic_names=[nic_name for _, nic_name, _ in names],
+        ip_names=[ip_name for _, _, ip_name in names],
+        keep_network=keep_network,
+        max_workers=max_workers,
+    )
+
+def assign_shards(container_name, n_workers, prefix=None, blob_name=None):
+    # Either the CSV blobs under `prefix` (largest first, each to the least loaded worker) or
+    # newline-aligned byte ranges of the single blob `blob_name`. Workers without work get no shard.
+    if (prefix is None) == (blob_name is None):
+        raise ValueError("Pass exactly one of prefix or blob_name.")
+
+    if blob_name is not None:
+        columns, byte_ranges = split_byte_ranges(get_blob_client(container_name, blob_name), n_workers)
+        return [
+            {'container': container_name, 'blob': blob_name, 'offset': offset, 'length': length, 'columns': columns}
+            for offset, length in byte_ranges
+        ]
+
+    container_client = get_blob_service_client().get_container_client(container_name)
+    blobs = sorted(
+        (blob for blob in container_client.list_blobs(name_starts_with=prefix) if blob.name.endswith('.csv')),
+        key=lambda blob: blob.size, reverse=True,
+    )
+    if not blobs:
+        raise ValueError(f"No CSV blobs under '{prefix}' in container '{container_name}'.")
+
+    loads = [0] * n_workers
+    blob_names = [[] for _ in range(n_workers)]
+    for blob in blobs:
+        index = loads.index(min(loads))
+        loads[index] += blob.size
+        blob_names[index].append(blob.name)
+    return [{'container': container_name, 'blobs': sorted(names)} for names in blob_names if names]
+
+def partial_blob_name(run_id, index):
+    return f"{PARTIALS_PREFIX}{run_id}/worker-{index}.csv"
+
+def run_worker(shard, run_id, index, chunksize=DEFAULT_CHUNKSIZE):
+    # What every worker VM runs: aggregate the shard and upload the partial state
+    if 'blobs' in shard:
+        state = merge_all(
+            aggregate_chunks(load_blob_chunks(shard['container'], blob_name, chunksize=chunksize, usecols=AGGREGATE_COLUMNS))
+            for blob_name in shard['blobs']
+        )
+    else:
+        state = aggregate_byte_range(
+            (shard['container'], shard['blob'], shard['offset'], shard['length'], shard['columns'], 'Country', chunksize)
+        )
+    if state is None:
+        # Shard without data rows: the reducer still expects this worker's partial
+        state = empty_state('Country')
+    upload_dataframe_to_azure_storage(state.reset_index(), container_name=RESULT_CONTAINER, blob_name=partial_blob_name(run_id, index))
+    return partial_blob_name(run_id, index)
+
+def worker_command(shard, run_id, index):
+    return ["worker", "--run-id", run_id, "--index", str(index), "--shard", json.dumps(shard)]
+
+class LocalProcessRunner:
+    # Runs every worker as a local process instead of a VM (tests, or one big machine).
+    # fake_storage_root makes the workers use fake_blob_storage.py under that directory.
+    def __init__(self, fake_storage_root=None):
+        self.fake_storage_root = fake_storage_root
+
+    def run(self, shards, run_id):
+        script = os.path.abspath(__file__)
+        processes = []
+        for index, shard in enumerate(shards):
+            command = [sys.executable, script] + worker_command(shard, run_id, index)
+            if self.fake_storage_root is not None:
+                command += ["--fake-storage-root", self.fake_storage_root]
+            processes.append(subprocess.Popen(command, cwd=os.path.dirname(script)))
+
+        failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+        if failed:
+            raise RuntimeError(f"Workers {failed} of run '{run_id}' failed.")
+
+class AzureVmRunner:
+    # Runs the workers on the fleet VMs through the Run Command API (no SSH needed). The VMs need
+    # the repository at remote_dir with its requirements installed, and a managed identity with
+    # Storage Blob Data Contributor on the storage account; provision_fleet sets up both.
+    # setup_commands run (as root) before every worker command.
+    def __init__(self, vm_names, remote_dir=FLEET_REMOTE_DIR, setup_commands=FLEET_SETUP_COMMANDS):
+        self.vm_names = vm_names
+        self.remote_dir = remote_dir
+        self.setup_commands = list(setup_commands)
+
+    def run_on_vm(self, vm_name, shard, run_id, index):
+        import create_all
+
+        command = " ".join(shlex.quote(argument) for argument in ["python3", "fleet.py"] + worker_command(shard, run_id, index))
+        script = self.setup_commands + [
+            f"cd {shlex.quote(self.remote_dir)}",
+            f"export data_engineer_test_storage_account={shlex.quote(create_all.STORAGE_ACCOUNT)}",
+            command,
+        ]
+        try:
+            result = create_all.compute_client.virtual_machines.begin_run_command(
+                create_all.RESOURCE_GROUP,
+                vm_name,
+                {"command_id": "RunShellScript", "script": script},
+            ).result()
+            print(f"Worker {index} on VM {vm_name} finished.")
+        except Exception as e:
+            error_message = traceback.format_exc()
+            print(f"An error occurred on VM {vm_name}:")
+            print(error_message)
+            # Logging in production
+            raise e
+        return result
+
+    def run(self, shards, run_id):
+        if len(shards) > len(self.vm_names):
+            raise ValueError(f"{len(shards)} shards but only {len(self.vm_names)} worker VMs.")
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [
+                executor.submit(self.run_on_vm, self.vm_names[index], shard, run_id, index)
+                for index, shard in enumerate(shards)
+            ]
+            for future in futures:
+                future.result()
+
+def reduce_partials(run_id, n_partials, n_top, by='Country'):
+    # Run Command does not report the worker's exit code, so a missing partial is the failure signal
+    states = []
+    for index in range(n_partials):
+        data = get_blob_client(RESULT_CONTAINER, partial_blob_name(run_id, index)).download_blob().readall()
+        state = pd.read_csv(io.BytesIO(data), dtype={by: 'str', 'count': 'int64', 'sum': 'float64', 'sum_error': 'float64'},
+                            keep_default_na=False, float_precision='round_trip')
+        states.append(state.set_index(by))
+    return top_n_from_state(merge_all(states), n_top, by=by)
+
+def run_fleet(runner, n_workers, container_name="raw", prefix=None, blob_name=None, n_top=3, run_id=None):
+    # SQL Equivalent (over the whole shard set):
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Country
+    # ORDER BY average_rating DESC LIMIT 3;
+    run_id = run_id or time.strftime("%Y%m%dT%H%M%S")
+    shards = assign_shards(container_name, n_workers, prefix=prefix, blob_name=blob_name)
+    print(f"Run '{run_id}': {len(shards)} shards over {n_workers} workers.")
+    runner.run(shards, run_id)
+    return reduce_partials(run_id, len(shards), n_top)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed top-N analysis over a fleet of worker VMs (or local processes).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = subparsers.add_parser("worker", help="aggregate one shard (run on a worker)")
+    worker_parser.add_argument("--run-id", required=True)
+    worker_parser.add_argument("--index", type=int, required=True)
+    worker_parser.add_argument("--shard", required=True, help="JSON shard description from assign_shards")
+    worker_parser.add_argument("--fake-storage-root", default=None)
+
+    run_parser = subparsers.add_parser("run", help="provision (optionally), fan out, reduce and upload the top-N CSV")
+    run_parser.add_argument("--workers", type=int, required=True)
+    run_parser.add_argument("--prefix", default=None, help="shard the CSV blobs under this prefix")
+    run_parser.add_argument("--blob", default=None, help="shard this blob by byte ranges")
+    run_parser.add_argument("--local", action="store_true", help="use local processes instead of VMs")
+    run_parser.add_argument("--provision", action="store_true", help="create the worker VMs first")
+    run_parser.add_argument("--custom-data", default=None,
+                            help="cloud-init script for provisioned workers (default: clone data_engineer_test_fleet_repo_url and install its requirements)")
+    run_parser.add_argument("--setup-command", action="append", default=None,
+                            help="shell command run on every worker VM before the worker, after waiting for cloud-init (repeatable)")
+    run_parser.add_argument("--remote-dir", default=FLEET_REMOTE_DIR, help="absolute path of the repository on the worker VMs")
+    run_parser.add_argument("--teardown", action="store_true", help="delete the worker VMs afterwards")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        if args.fake_storage_root is not None:
+            from fake_blob_storage import FakeBlobServiceClient
+            set_blob_service_client(FakeBlobServiceClient(args.fake_storage_root))
+        run_worker(json.loads(args.shard), args.run_id, args.index)
+    else:
+        if args.local:
+            runner = LocalProcessRunner()
+        else:
+            # A path on the Linux workers, whatever the OS of this machine
+            if not args.remote_dir.startswith("/"):
+                parser.error("--remote-dir must be an absolute path.")
+            if args.provision:
+                custom_data = None
+                if args.custom_data is not None:
+                    with open(args.custom_data, "r") as file:
+                        custom_data = file.read()
+                provision_fleet(args.workers, custom_data=custom_data, remote_dir=args.remote_dir)
+            runner = AzureVmRunner(
+                [worker_resource_names(index)[0] for index in range(args.workers)],
+                remote_dir=args.remote_dir,
+                setup_commands=FLEET_SETUP_COMMANDS + (args.setup_command or []),
+            )
+        try:
+            top_countries = run_fleet(runner, args.workers, prefix=args.prefix, blob_name=args.blob)
+        finally:
+            if args.teardown and not args.local:
+                teardown_fleet(args.workers)
+        filepath = write_to_csv(top_countries, "./Anastasios-Iliopoulos.csv")
+        upload_to_azure_storage(container_name=RESULT_CONTAINER, blob_name="Anastasios-Iliopoulos/Anastasios-Iliopoulos-fleet.csv", local_file_path=filepath)
\ No newline at end of file
@@ -0,0 +1,224 @@
+import pandas as pd
+import contextlib
+import functools
+import inspect
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# Per-stage metrics (wall time, rows, bytes, peak memory) for the pipeline and provisioning scripts.
+# Nothing is emitted unless data_engineer_test_metrics_path is set ("-" writes to stdout).
+# jsonl appends one record per stage run; prometheus rewrites a text-format snapshot of running
+# totals on every record (node_exporter textfile collector style).
+METRICS_PATH = os.environ.get('data_engineer_test_metrics_path')
+METRICS_FORMAT = os.environ.get('data_engineer_test_metrics_format', 'jsonl')
+METRICS_PREFIX = 'data_engineer_test'
+
+emit_lock = threading.Lock()
+active_stages = threading.local()
+# Stages running in any thread. The peak is only reset when all of them belong to the entering
+# thread, otherwise the reset would wipe the peak of a stage running concurrently elsewhere.
+rss_lock = threading.Lock()
+running_stage_count = 0
+prometheus_totals = {}
+
+def reset_peak_rss():
+    # Linux only: writing "5" resets VmHWM, so the next reading is the peak since this call
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_bytes():
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Process-wide high-water mark (kilobytes on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def stage_stack():
+    if not hasattr(active_stages, 'stack'):
+        active_stages.stack = []
+    return active_stages.stack
+
+def current_stage():
+    stack = stage_stack()
+    return stack[-1] if stack else None
+
+def annotate(rows=None, bytes=None):
+    # Adds rows/bytes to the innermost running stage of this thread (no-op outside a stage)
+    record = current_stage()
+    if record is None:
+        return
+    if rows is not None:
+        record['rows'] = (record['rows'] or 0) + rows
+    if bytes is not None:
+        record['bytes'] = (record['bytes'] or 0) + bytes
+
+def count_bytes(chunks):
+    # Passes chunks through, adding their size to whatever stage is running when each is pulled
+    for chunk in chunks:
+        annotate(bytes=len(chunk))
+        yield chunk
+
+def enter(record):
+    # The high-water mark is process-wide: before resetting it for this stage, credit the
+    # current value to every enclosing stage so that their peaks survive the reset.
+    # When stages of other threads are running it is left alone and the stage reports the
+    # process-wide peak instead (peak_rss_scope "process").
+    global running_stage_count
+    stack = stage_stack()
+    with rss_lock:
+        current = peak_rss_bytes()
+        for outer in stack:
+            outer['peak_rss_bytes'] = max(outer['peak_rss_bytes'], current)
+        if running_stage_count != len(stack) or not reset_peak_rss():
+            record['peak_rss_scope'] = 'process'
+        running_stage_count += 1
+    stack.append(record)
+
+def leave(record):
+    global running_stage_count
+    stack = stage_stack()
+    stack.remove(record)
+    with rss_lock:
+        running_stage_count -= 1
+    current = peak_rss_bytes()
+    record['peak_rss_bytes'] = max(record['peak_rss_bytes'], current)
+    for outer in stack:
+        outer['peak_rss_bytes'] = max(outer['peak_rss_bytes'], current)
+
+def new_record(name, labels):
+    parent = current_stage()
+    return {
+        'stage': name,
+        'parent': parent['stage'] if parent is not None else None,
+        'started_at': time.time(),
+        'wall_s': 0.0,
+        'rows': None,
+        'bytes': None,
+        'peak_rss_bytes': 0,
+        'peak_rss_scope': 'stage',
+        'status': 'ok',
+        **labels,
+    }
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    record = new_record(name, labels)
+    enter(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['status'] = 'error'
+        record['error'] = repr(e)
+        raise
+    finally:
+        record['wall_s'] = time.perf_counter() - start
+        leave(record)
+        emit(record)
+
+def instrumented(name=None, **labels):
+    # Decorator form of stage(). DataFrame results count as rows unless the function annotated
+    # them itself. For generator functions only the time spent producing items is counted,
+    # not the time the consumer spends between them.
+    def decorator(fn):
+        stage_name = name or fn.__name__
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                record = new_record(stage_name, labels)
+                generator = fn(*args, **kwargs)
+                try:
+                    while True:
+                        enter(record)
+                        start = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            record['wall_s'] += time.perf_counter() - start
+                            leave(record)
+                        if isinstance(item, pd.DataFrame):
+                            record['rows'] = (record['rows'] or 0) + len(item)
+                        yield item
+                except BaseException as e:
+                    if not isinstance(e, GeneratorExit):
+                        record['status'] = 'error'
+                        record['error'] = repr(e)
+                    raise
+                finally:
+                    generator.close()
+                    emit(record)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name, **labels) as record:
+                result = fn(*args, **kwargs)
+                if isinstance(result, pd.DataFrame) and record['rows'] is None:
+                    record['rows'] = len(result)
+                return result
+        return wrapper
+    return decorator
+
+def prometheus_text():
+    lines = []
+    metrics = [
+        ('stage_runs_total', 'counter', 'Completed runs per stage'),
+        ('stage_errors_total', 'counter', 'Failed runs per stage'),
+        ('stage_seconds_total', 'counter', 'Wall time spent per stage'),
+        ('stage_rows_total', 'counter', 'Rows processed per stage'),
+        ('stage_bytes_total', 'counter', 'Bytes transferred or produced per stage'),
+        ('stage_peak_rss_bytes', 'gauge', 'Peak resident memory during the last run of the stage'),
+    ]
+    for metric, metric_type, help_text in metrics:
+        lines.append(f"# HELP {METRICS_PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_{metric} {metric_type}")
+        for stage_name, totals in sorted(prometheus_totals.items()):
+            lines.append(f'{METRICS_PREFIX}_{metric}{{stage="{stage_name}"}} {totals[metric]}')
+    return "\n".join(lines) + "\n"
+
+def emit(record):
+    if METRICS_PATH is None:
+        return
+
+    with emit_lock:
+        if METRICS_FORMAT == 'prometheus':
+            totals = prometheus_totals.setdefault(record['stage'], {
+                'stage_runs_total': 0, 'stage_errors_total': 0, 'stage_seconds_total': 0.0,
+                'stage_rows_total': 0, 'stage_bytes_total': 0, 'stage_peak_rss_bytes': 0,
+            })
+            totals['stage_runs_total'] += 1
+            totals['stage_errors_total'] += record['status'] == 'error'
+            totals['stage_seconds_total'] += record['wall_s']
+            totals['stage_rows_total'] += record['rows'] or 0
+            totals['stage_bytes_total'] += record['bytes'] or 0
+            totals['stage_peak_rss_bytes'] = record['peak_rss_bytes']
+            text = prometheus_text()
+            if METRICS_PATH == '-':
+                sys.stdout.write(text)
+            else:
+                temp_path = f"{METRICS_PATH}.{os.getpid()}.tmp"
+                with open(temp_path, "w") as file:
+                    file.write(text)
+                os.replace(temp_path, METRICS_PATH)
+        else:
+            line = json.dumps(record, default=str) + "\n"
+            if METRICS_PATH == '-':
+                sys.stdout.write(line)
+            else:
+                with open(METRICS_PATH, "a") as file:
+                    file.write(line)
\ No newline at end of file
@@ -1,109 +1,332 @@
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
-import pandas as pd
-import os
-import tempfile
-import traceback
-
-ACCOUNT_NAME = os.environ['data_engineer_test_storage_account']
-
-credential = DefaultAzureCredential()
-blob_service_client = BlobServiceClient(account_url=f"https://{ACCOUNT_NAME}.blob.core.windows.net", credential=credential)
-
-def load_blob(container_name, blob_name, save_local_path=None):
-    container_client = blob_service_client.get_container_client(container_name)
-    if not container_client.exists():
-        raise ValueError(f"Container '{container_name}' does not exist.")
-        
-    blob_client = container_client.get_blob_client(blob_name)
-    if not blob_client.exists():
-        raise ValueError(f"Blob '{blob_name}' does not exist in container '{container_name}'.")
-    
-    try:
-        downloaded_object = blob_client.download_blob()
-        data = downloaded_object.readall()
-        
-        if save_local_path is not None:
-            with open(os.path.join(".", os.path.normpath(save_local_path)), "wb") as file:
-                file.write(data)
-            print(f"Blob downloaded to {os.path.join('.', save_local_path)}")
-        
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            temp_file_path = os.path.join(tmpdirname, 'temp_blob.csv')
-            with open(temp_file_path, 'wb') as temp_file:
-                temp_file.write(data)
-            df = pd.read_csv(temp_file_path)
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-    return df
-
-def aggregate_data(df):
-    # SQL Equivalent:
-    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset 
-    # GROUP BY Country;
-    grouped_data = df.groupby('Country')['Rating'].mean().reset_index().rename(columns={'Rating':'average_rating'})
-    return grouped_data
-
-def aggregate_and_get_top(df, n_top):
-    # SQL Equivalent:
-    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset 
-    # GROUP BY Country;
-    grouped_data = df.groupby('Country')['Rating'].mean().reset_index().rename(columns={'Rating':'average_rating'})
-
-    # SQL Equivalent:
-    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset 
-    # GROUP BY Country 
-    # ORDER BY average_rating DESC LIMIT 3;
-    top_3_countries = grouped_data.nlargest(n_top, 'average_rating')
-    return top_3_countries
-
-def write_to_csv(df, save_local_path):
-    try:
-        df.to_csv(os.path.join(".", os.path.normpath(save_local_path)), index=False)
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-    
-    return os.path.join(".", os.path.normpath(save_local_path))
-
-def upload_to_azure_storage(container_name, blob_name, local_file_path):
-    container_client = blob_service_client.get_container_client(container_name)
-    
-    try:
-        if not container_client.exists():
-            container_client.create_container()
-        else:
-            print(f"Container '{container_name}' already exists.")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-
-    blob_client = container_client.get_blob_client(blob_name)
-
-    try:
-        with open(local_file_path, "rb") as data:
-            blob_client.upload_blob(data, overwrite=True)
-        print("Blob uploaded succefully!")
-    except Exception as e:
-        error_message = traceback.format_exc()
-        print(f"An error occurred:")
-        print(error_message)
-        # Logging in production
-        raise e
-    
-if __name__ == "__main__":
-    df = load_blob(container_name="raw", blob_name="tourism_dataset.csv", save_local_path=f"./tourism_dataset.csv")
-    aggregated_df = aggregate_data(df)
-    top_countries = aggregate_and_get_top(df, 3)
-    filepath = write_to_csv(top_countries, "./Anastasios-Iliopoulos.csv")
-    upload_to_azure_storage(container_name="anastasios-iliopoulos", blob_name="Anastasios-Iliopoulos/Anastasios-Iliopoulos.csv", local_file_path="./Anastasios-Iliopoulos.csv")
\ No newline at end of file
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock
+from azure_clients import get_blob_client, get_blob_service_client, get_or_create_container_client, not_found_error
+from aggregation import aggregate_chunks, finalize_average, top_n_from_state
+from blob_stream import DEFAULT_CHUNKSIZE, open_chunk_stream
+from instrumentation import annotate, count_bytes, instrumented, stage
+from tourism_schema import AGGREGATE_COLUMNS, read_tourism_csv
+from vectorized_aggregation import aggregate_metrics
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import io
+import os
+import traceback
+
+# Parquet output: low-cardinality text columns are dictionary-encoded, pages compressed
+PARQUET_DICTIONARY_COLUMNS = ['Country', 'Category']
+PARQUET_COMPRESSION = 'snappy'
+PARQUET_CACHE_PREFIX = 'parquet-cache/'
+
+# In-memory uploads: outputs larger than one block are staged as concurrent blocks
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+UPLOAD_MAX_CONCURRENCY = 4
+UPLOAD_ROWS_PER_SLICE = 100000
+
+# Set to "1" to also keep local copies of the results that are uploaded
+SAVE_LOCAL_RESULT = os.environ.get('data_engineer_test_save_local_result', '0') == '1'
+
+def load_blob(container_name, blob_name, save_local_path=None, usecols=None):
+    blob_client = get_blob_client(container_name, blob_name)
+    
+    try:
+        with stage("download", blob=blob_name) as record:
+            downloaded_object = blob_client.download_blob()
+            data = downloaded_object.readall()
+            record['bytes'] = len(data)
+        
+        if save_local_path is not None:
+            with open(os.path.join(".", os.path.normpath(save_local_path)), "wb") as file:
+                file.write(data)
+            print(f"Blob downloaded to {os.path.join('.', save_local_path)}")
+        
+        with stage("parse", blob=blob_name) as record:
+            df = read_tourism_csv(io.BytesIO(data), usecols=usecols)
+            record['rows'] = len(df)
+            record['bytes'] = len(data)
+    except ResourceNotFoundError as e:
+        raise not_found_error(e, container_name, blob_name) from e
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return df
+
+@instrumented("download_parse")
+def load_blob_chunks(container_name, blob_name, chunksize=DEFAULT_CHUNKSIZE, save_local_path=None, usecols=None, reader=read_tourism_csv):
+    # Streams the blob straight into the CSV parser and yields DataFrames of at most `chunksize` rows.
+    # Nothing is buffered on disk; save_local_path (if given) is filled as the chunks are consumed,
+    # under a temporary name that only becomes save_local_path once the whole blob was read.
+    blob_client = get_blob_client(container_name, blob_name)
+
+    local_file = None
+    try:
+        downloaded_object = blob_client.download_blob()
+        if save_local_path is not None:
+            local_path = os.path.join(".", os.path.normpath(save_local_path))
+            local_file = open(f"{local_path}.tmp", "wb")
+
+        stream = open_chunk_stream(count_bytes(downloaded_object.chunks()), tee=local_file)
+        with reader(stream, usecols=usecols, chunksize=chunksize) as chunks:
+            for chunk in chunks:
+                yield chunk
+        if local_file is not None:
+            local_file.close()
+            local_file = None
+            os.replace(f"{local_path}.tmp", local_path)
+            print(f"Blob downloaded to {os.path.join('.', save_local_path)}")
+    except ResourceNotFoundError as e:
+        raise not_found_error(e, container_name, blob_name) from e
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    finally:
+        # Failed or stopped early: the partial copy goes
+        if local_file is not None:
+            local_file.close()
+            os.remove(f"{local_path}.tmp")
+
+@instrumented("groupby")
+def aggregate_data(df):
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset 
+    # GROUP BY Country;
+    grouped_data = aggregate_metrics(df, by=['Country'], metrics={'average_rating': ('Rating', 'mean')})
+    annotate(rows=len(df))
+    return grouped_data
+
+@instrumented("groupby")
+def aggregate_and_get_top(df, n_top):
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset 
+    # GROUP BY Country;
+    grouped_data = aggregate_metrics(df, by=['Country'], metrics={'average_rating': ('Rating', 'mean')})
+    annotate(rows=len(df))
+
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset 
+    # GROUP BY Country 
+    # ORDER BY average_rating DESC LIMIT 3;
+    top_3_countries = grouped_data.nlargest(n_top, 'average_rating')
+    return top_3_countries
+
+@instrumented("serialize", format='csv')
+def write_to_csv(df, save_local_path):
+    try:
+        df.to_csv(os.path.join(".", os.path.normpath(save_local_path)), index=False)
+        annotate(rows=len(df), bytes=os.path.getsize(os.path.join(".", os.path.normpath(save_local_path))))
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    
+    return os.path.join(".", os.path.normpath(save_local_path))
+
+@instrumented("serialize", format='parquet')
+def write_to_parquet(df, save_local_path, compression=PARQUET_COMPRESSION):
+    try:
+        dictionary_columns = [column for column in PARQUET_DICTIONARY_COLUMNS if column in df.columns]
+        df.to_parquet(
+            os.path.join(".", os.path.normpath(save_local_path)),
+            index=False,
+            engine='pyarrow',
+            compression=compression,
+            use_dictionary=dictionary_columns,
+        )
+        annotate(rows=len(df), bytes=os.path.getsize(os.path.join(".", os.path.normpath(save_local_path))))
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+    return os.path.join(".", os.path.normpath(save_local_path))
+
+def get_or_create_container(container_name):
+    try:
+        container_client = get_or_create_container_client(container_name)
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return container_client
+
+@instrumented("upload")
+def upload_to_azure_storage(container_name, blob_name, local_file_path):
+    container_client = get_or_create_container(container_name)
+
+    blob_client = container_client.get_blob_client(blob_name)
+
+    try:
+        with open(local_file_path, "rb") as data:
+            blob_client.upload_blob(data, overwrite=True)
+        annotate(bytes=os.path.getsize(local_file_path))
+        print("Blob uploaded succefully!")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+@instrumented("serialize", format='csv')
+def serialize_csv(df, rows_per_slice=UPLOAD_ROWS_PER_SLICE):
+    # Yields the CSV (same format as write_to_csv) slice by slice so uploading can start early
+    for start in range(0, max(len(df), 1), rows_per_slice):
+        part = df.iloc[start:start + rows_per_slice].to_csv(index=False, header=(start == 0)).encode("utf-8")
+        annotate(rows=min(rows_per_slice, len(df) - start), bytes=len(part))
+        yield part
+
+@instrumented("serialize", format='parquet')
+def serialize_parquet(df, compression=PARQUET_COMPRESSION):
+    buffer = io.BytesIO()
+    dictionary_columns = [column for column in PARQUET_DICTIONARY_COLUMNS if column in df.columns]
+    df.to_parquet(buffer, index=False, engine='pyarrow', compression=compression, use_dictionary=dictionary_columns)
+    annotate(rows=len(df), bytes=buffer.tell())
+    yield buffer.getvalue()
+
+@instrumented("upload")
+def upload_dataframe_to_azure_storage(df, container_name, blob_name, file_format='csv', block_size=UPLOAD_BLOCK_SIZE, max_concurrency=UPLOAD_MAX_CONCURRENCY):
+    # Serializes df straight into memory and uploads it without a local file.
+    # Small outputs go up in one request; larger ones are cut into blocks that are staged
+    # concurrently while the rest of the frame is still being serialized.
+    if file_format == 'csv':
+        parts = serialize_csv(df)
+    elif file_format == 'parquet':
+        parts = serialize_parquet(df)
+    else:
+        raise ValueError(f"Unsupported file format '{file_format}'. Choose 'csv' or 'parquet'.")
+
+    container_client = get_or_create_container(container_name)
+    blob_client = container_client.get_blob_client(blob_name)
+
+    try:
+        pending = bytearray()
+        block_ids = []
+        in_flight = []
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for part in parts:
+                pending += part
+                annotate(bytes=len(part))
+                while len(pending) >= block_size:
+                    block_id = base64.b64encode(f"{len(block_ids):08d}".encode()).decode()
+                    block_ids.append(block_id)
+                    in_flight.append(executor.submit(blob_client.stage_block, block_id, bytes(pending[:block_size])))
+                    del pending[:block_size]
+                    # Bound memory: do not serialize further ahead than the uploads can absorb
+                    while len(in_flight) > 2 * max_concurrency:
+                        in_flight.pop(0).result()
+
+            if not block_ids:
+                blob_client.upload_blob(bytes(pending), overwrite=True)
+            else:
+                if pending:
+                    block_id = base64.b64encode(f"{len(block_ids):08d}".encode()).decode()
+                    block_ids.append(block_id)
+                    in_flight.append(executor.submit(blob_client.stage_block, block_id, bytes(pending)))
+                for future in in_flight:
+                    future.result()
+                blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids])
+        print("Blob uploaded succefully!")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def parquet_cache_blob_name(blob_name):
+    return PARQUET_CACHE_PREFIX + os.path.splitext(blob_name)[0] + '.parquet'
+
+def cache_blob_as_parquet(container_name, blob_name, chunksize=DEFAULT_CHUNKSIZE):
+    # Converts the raw CSV blob into a Parquet copy next to it (one row group per chunk).
+    # The source ETag is stored in the blob metadata so a stale copy can be detected.
+    container_client = get_blob_service_client().get_container_client(container_name)
+    source_etag = container_client.get_blob_client(blob_name).get_blob_properties().etag
+    parquet_blob_name = parquet_cache_blob_name(blob_name)
+
+    buffer = io.BytesIO()
+    writer = None
+    try:
+        for chunk in load_blob_chunks(container_name, blob_name, chunksize=chunksize):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                dictionary_columns = [column for column in PARQUET_DICTIONARY_COLUMNS if column in chunk.columns]
+                writer = pq.ParquetWriter(buffer, table.schema, compression=PARQUET_COMPRESSION, use_dictionary=dictionary_columns)
+            writer.write_table(table.cast(writer.schema))
+        if writer is not None:
+            writer.close()
+
+        container_client.get_blob_client(parquet_blob_name).upload_blob(
+            buffer.getvalue(), overwrite=True, metadata={'source_etag': source_etag.strip('"')}
+        )
+        print(f"Parquet copy of '{blob_name}' cached as '{parquet_blob_name}'.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return parquet_blob_name
+
+def load_parquet_blob(container_name, blob_name, columns=None):
+    blob_client = get_blob_client(container_name, blob_name)
+
+    try:
+        with stage("download", blob=blob_name) as record:
+            data = blob_client.download_blob().readall()
+            record['bytes'] = len(data)
+        with stage("parse", blob=blob_name, format='parquet') as record:
+            df = pd.read_parquet(io.BytesIO(data), columns=columns)
+            record['rows'] = len(df)
+            record['bytes'] = len(data)
+    except ResourceNotFoundError as e:
+        raise not_found_error(e, container_name, blob_name) from e
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return df
+
+def refresh_parquet_cache(container_name, blob_name):
+    # Converts the CSV if there is no Parquet copy yet or the CSV changed since it was made;
+    # returns the name of the (now current) Parquet copy
+    container_client = get_blob_service_client().get_container_client(container_name)
+    source_etag = container_client.get_blob_client(blob_name).get_blob_properties().etag.strip('"')
+    parquet_blob_client = container_client.get_blob_client(parquet_cache_blob_name(blob_name))
+
+    if not parquet_blob_client.exists() or parquet_blob_client.get_blob_properties().metadata.get('source_etag') != source_etag:
+        cache_blob_as_parquet(container_name, blob_name)
+    return parquet_cache_blob_name(blob_name)
+
+def load_blob_via_parquet_cache(container_name, blob_name, columns=None):
+    # Reads the cached Parquet copy (only the requested columns)
+    return load_parquet_blob(container_name, refresh_parquet_cache(container_name, blob_name), columns=columns)
+
+if __name__ == "__main__":
+    # Only Country and Rating are parsed; the local copy still holds the full CSV
+    chunks = load_blob_chunks(container_name="raw", blob_name="tourism_dataset.csv", save_local_path=f"./tourism_dataset.csv", usecols=AGGREGATE_COLUMNS)
+    # The chunks are pulled by the groupby, so its wall time includes download_parse (reported separately too)
+    with stage("groupby"):
+        state = aggregate_chunks(chunks)
+        aggregated_df = finalize_average(state)
+        top_countries = top_n_from_state(state, 3)
+    upload_dataframe_to_azure_storage(top_countries, container_name="anastasios-iliopoulos", blob_name="Anastasios-Iliopoulos/Anastasios-Iliopoulos.csv")
+    upload_dataframe_to_azure_storage(top_countries, container_name="anastasios-iliopoulos", blob_name="Anastasios-Iliopoulos/Anastasios-Iliopoulos.parquet", file_format='parquet')
+    if SAVE_LOCAL_RESULT:
+        write_to_csv(top_countries, "./Anastasios-Iliopoulos.csv")
+        write_to_parquet(top_countries, "./Anastasios-Iliopoulos.parquet")
\ No newline at end of file
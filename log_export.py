@@ -0,0 +1,209 @@
+from azure_clients import get_logs_query_client
+from instrumentation import annotate, stage
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import traceback
+
+# Log download of part 1 (question 4), without one query over the whole window: the timespan is
+# cut into slices that run concurrently, a slice that returns too many rows (or a partial result)
+# is split in two, and every finished slice is written as its own Parquet file under
+# <export_dir>/date=YYYY-MM-DD/. A checkpoint lists the finished slices, so a re-run only queries the rest.
+WORKSPACE_ID = os.environ.get('data_engineer_test_log_analytics_workspace_id')
+EXPORT_DIR = os.environ.get('data_engineer_test_log_export_dir', './logs')
+# A slice returning more rows is split; well below the service's limit of 500,000 rows per result
+MAX_SLICE_ROWS = int(os.environ.get('data_engineer_test_log_slice_rows', '100000'))
+# Slices are never split below this width
+MIN_SLICE = timedelta(seconds=1)
+# Initial slices are aligned to this grid, so none of them crosses midnight
+INITIAL_SLICE = timedelta(hours=1)
+# Log Analytics throttles a user to 5 concurrent queries
+MAX_CONCURRENT_QUERIES = 5
+
+# Files starting with "_" or "." are skipped when pyarrow reads the export directory as a dataset
+CHECKPOINT_NAME = "_checkpoint.json"
+STATUS_SUCCESS = "Success"
+
+# Log Analytics column type -> Parquet type, so every part file of an export has the same schema
+ARROW_TYPES = {
+    'datetime': pa.timestamp('us', tz='UTC'),
+    'bool': pa.bool_(),
+    'int': pa.int32(),
+    'long': pa.int64(),
+    'real': pa.float64(),
+}
+
+def resource_query(table, resource_id):
+    return f"""
+{table}
+| where ResourceId == "{resource_id}"
+"""
+
+def slice_query(query, start, end, max_rows=MAX_SLICE_ROWS):
+    # Half-open bounds, so an event on a slice boundary is exported once. One row more than
+    # max_rows is enough to know the slice has to be split.
+    return f"""{query.rstrip()}
+| where TimeGenerated >= datetime({start.isoformat()}) and TimeGenerated < datetime({end.isoformat()})
+| take {max_rows + 1}
+"""
+
+def initial_slices(start, end, width=INITIAL_SLICE):
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    slices = []
+    boundary = start
+    while boundary < end:
+        next_boundary = min(epoch + ((boundary - epoch) // width + 1) * width, end)
+        slices.append((boundary, next_boundary))
+        boundary = next_boundary
+    return slices
+
+def remaining_slices(slices, completed):
+    # The parts of `slices` not covered by the completed intervals of a previous run
+    remaining = []
+    completed = sorted(completed)
+    for start, end in slices:
+        for done_start, done_end in completed:
+            if done_end <= start or done_start >= end:
+                continue
+            if done_start > start:
+                remaining.append((start, done_start))
+            start = max(start, done_end)
+            if start >= end:
+                break
+        if start < end:
+            remaining.append((start, end))
+    return remaining
+
+def checkpoint_path(export_dir):
+    return os.path.join(export_dir, CHECKPOINT_NAME)
+
+def read_checkpoint(export_dir, query):
+    try:
+        with open(checkpoint_path(export_dir), "r") as file:
+            checkpoint = json.load(file)
+    except FileNotFoundError:
+        return {'query': query, 'completed': []}
+    if checkpoint['query'] != query:
+        raise ValueError(f"{export_dir} holds an export of a different query; use another export_dir.")
+    checkpoint['completed'] = [(datetime.fromisoformat(start), datetime.fromisoformat(end)) for start, end in checkpoint['completed']]
+    return checkpoint
+
+def write_checkpoint(export_dir, checkpoint):
+    temp_path = f"{checkpoint_path(export_dir)}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump({
+            'query': checkpoint['query'],
+            'completed': [(start.isoformat(), end.isoformat()) for start, end in sorted(checkpoint['completed'])],
+        }, file, indent=2)
+    os.replace(temp_path, checkpoint_path(export_dir))
+
+def part_path(export_dir, start, end):
+    return os.path.join(export_dir, f"date={start:%Y-%m-%d}", f"part-{start:%Y%m%dT%H%M%S%f}-{end:%Y%m%dT%H%M%S%f}.parquet")
+
+def remove_unrecorded_parts(export_dir, completed):
+    # A run that stopped between writing a part and recording it in the checkpoint leaves an
+    # orphan file; its slice is queried again, so the file goes
+    recorded = {os.path.normpath(part_path(export_dir, start, end)) for start, end in completed}
+    for directory, _, file_names in os.walk(export_dir):
+        for file_name in file_names:
+            path = os.path.normpath(os.path.join(directory, file_name))
+            if file_name.startswith("part-") and path not in recorded:
+                os.remove(path)
+
+def logs_table_to_arrow(table):
+    columns = {}
+    for index, (column, column_type) in enumerate(zip(table.columns, table.columns_types)):
+        # dynamic, guid, timespan, decimal and string values are kept as text
+        arrow_type = ARROW_TYPES.get(column_type, pa.string())
+        values = [row[index] for row in table.rows]
+        if arrow_type == pa.string():
+            values = [value if value is None or isinstance(value, str) else json.dumps(value, default=str) for value in values]
+        columns[column] = pa.array(values, type=arrow_type)
+    return pa.table(columns)
+
+def query_slice(client, workspace_id, query, start, end, max_rows=MAX_SLICE_ROWS):
+    # The slice as an Arrow table, or None when it has to be split
+    with stage("log_query"):
+        response = client.query_workspace(workspace_id=workspace_id, query=slice_query(query, start, end, max_rows), timespan=(start, end))
+        if response.status != STATUS_SUCCESS:
+            return None
+        table = logs_table_to_arrow(response.tables[0])
+        annotate(rows=table.num_rows)
+    return table if table.num_rows <= max_rows else None
+
+def export_slice(client, workspace_id, query, start, end, export_dir, max_rows=MAX_SLICE_ROWS):
+    # Returns the number of rows written, or the two halves of the slice when it is too big
+    table = query_slice(client, workspace_id, query, start, end, max_rows)
+    if table is None:
+        if end - start <= MIN_SLICE:
+            raise ValueError(f"More than {max_rows} rows between {start} and {end}; raise the row limit or narrow the query.")
+        middle = start + (end - start) / 2
+        return [(start, middle), (middle, end)]
+
+    if table.num_rows > 0:
+        # Written under a hidden name first, so a part file is either complete or not there
+        path = part_path(export_dir, start, end)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, path)
+    return table.num_rows
+
+def export_logs(query, start, end, export_dir=EXPORT_DIR, workspace_id=WORKSPACE_ID, client=None,
+                max_workers=MAX_CONCURRENT_QUERIES, max_rows=MAX_SLICE_ROWS):
+    # Exports [start, end) (timezone-aware datetimes) and returns the number of rows written by this run.
+    # After the first failure no new slice is started; finished slices stay in the checkpoint.
+    client = client or get_logs_query_client()
+    os.makedirs(export_dir, exist_ok=True)
+    checkpoint = read_checkpoint(export_dir, query)
+    remove_unrecorded_parts(export_dir, checkpoint['completed'])
+
+    pending = remaining_slices(initial_slices(start, end), checkpoint['completed'])
+    running = {}
+    rows = 0
+    error = None
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                while error is None and pending and len(running) < max_workers:
+                    slice_start, slice_end = pending.pop(0)
+                    running[executor.submit(export_slice, client, workspace_id, query, slice_start, slice_end, export_dir, max_rows)] = (slice_start, slice_end)
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    slice_bounds = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                        continue
+                    if isinstance(result, list):
+                        # The halves go first, so the export keeps moving forward in time
+                        pending[:0] = result
+                    else:
+                        rows += result
+                        checkpoint['completed'].append(slice_bounds)
+                        write_checkpoint(export_dir, checkpoint)
+        if error is not None:
+            raise error
+        print(f"Logs from {start} to {end} exported to {export_dir}: {rows} rows.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return rows
+
+if __name__ == "__main__":
+    # Same export as part 1: the last 24 hours of one table for one resource
+    table = os.environ['data_engineer_test_log_table']
+    resource_id = os.environ['data_engineer_test_log_resource_id']
+    now = datetime.now(timezone.utc)
+    export_logs(resource_query(table, resource_id), now - timedelta(days=1), now)
\ No newline at end of file
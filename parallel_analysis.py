@@ -0,0 +1,92 @@
+from azure_clients import get_blob_client, get_blob_service_client, get_blob_service_client_override, set_blob_service_client
+from aggregation import aggregate_chunks, empty_state, merge_all, top_n_from_state
+from blob_stream import DEFAULT_CHUNKSIZE, open_chunk_stream
+from tourism_schema import aggregate_columns, read_tourism_csv
+import pandas as pd
+import multiprocessing
+import io
+import os
+import traceback
+
+# Bytes fetched per ranged request while looking for the next line break
+BOUNDARY_PROBE_BYTES = 64 * 1024
+
+def next_line_start(blob_client, offset, blob_size):
+    # First byte at or after `offset` that starts a new line. Start one byte early so that an
+    # offset that already sits right after a '\n' is kept as is.
+    position = offset - 1
+    while position < blob_size:
+        length = min(BOUNDARY_PROBE_BYTES, blob_size - position)
+        probe = blob_client.download_blob(offset=position, length=length).readall()
+        index = probe.find(b"\n")
+        if index >= 0:
+            return position + index + 1
+        position += length
+    return blob_size
+
+def split_byte_ranges(blob_client, n_ranges):
+    # Splits the data part of a CSV blob into newline-aligned (offset, length) ranges.
+    # Assumes no quoted field contains a line break, which holds for tourism_dataset.csv.
+    blob_size = blob_client.get_blob_properties().size
+    data_start = next_line_start(blob_client, 1, blob_size)
+    header = blob_client.download_blob(offset=0, length=data_start).readall()
+    columns = list(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+
+    targets = [data_start + (blob_size - data_start) * i // n_ranges for i in range(1, n_ranges)]
+    boundaries = [data_start]
+    for target in targets:
+        boundaries.append(next_line_start(blob_client, max(target, boundaries[-1]), blob_size))
+    boundaries.append(blob_size)
+
+    byte_ranges = [(start, end - start) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+    return columns, byte_ranges
+
+def aggregate_byte_range(args):
+    container_name, blob_name, offset, length, columns, by, chunksize = args
+    try:
+        blob_client = get_blob_service_client().get_blob_client(container_name, blob_name)
+        downloaded_object = blob_client.download_blob(offset=offset, length=length)
+        stream = open_chunk_stream(downloaded_object.chunks())
+        with read_tourism_csv(stream, usecols=aggregate_columns(by), header=None, names=columns, chunksize=chunksize) as reader:
+            return aggregate_chunks(reader, by=by)
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred while processing bytes {offset}-{offset + length} of '{blob_name}':")
+        print(error_message)
+        # Logging in production
+        raise e
+
+def parallel_aggregate(container_name, blob_name, pool_size=None, n_ranges=None, by='Country', chunksize=DEFAULT_CHUNKSIZE):
+    pool_size = pool_size or os.cpu_count()
+    # More ranges than workers so that a slow range does not leave the other cores idle
+    n_ranges = n_ranges or pool_size * 4
+
+    blob_client = get_blob_client(container_name, blob_name)
+
+    columns, byte_ranges = split_byte_ranges(blob_client, n_ranges)
+    if not byte_ranges:
+        # Header only: nothing to aggregate
+        return empty_state(by)
+    tasks = [(container_name, blob_name, offset, length, columns, by, chunksize) for offset, length in byte_ranges]
+
+    # spawn: every worker builds its own HTTP connections instead of sharing forked sockets.
+    # A client override (e.g. fake_blob_storage.py) has to be handed over explicitly.
+    with multiprocessing.get_context("spawn").Pool(pool_size, initializer=set_blob_service_client, initargs=(get_blob_service_client_override(),)) as pool:
+        results = pool.map_async(aggregate_byte_range, tasks)
+        partial_states = results.get()
+    return merge_all(partial_states)
+
+def parallel_aggregate_and_get_top(container_name, blob_name, n_top, pool_size=None, n_ranges=None):
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Country
+    # ORDER BY average_rating DESC LIMIT 3;
+    state = parallel_aggregate(container_name, blob_name, pool_size=pool_size, n_ranges=n_ranges)
+    return top_n_from_state(state, n_top)
+
+if __name__ == "__main__":
+    from load_analyze_write_upload import write_to_csv, upload_to_azure_storage
+
+    top_countries = parallel_aggregate_and_get_top(container_name="raw", blob_name="tourism_dataset.csv", n_top=3)
+    filepath = write_to_csv(top_countries, "./Anastasios-Iliopoulos.csv")
+    upload_to_azure_storage(container_name="anastasios-iliopoulos", blob_name="Anastasios-Iliopoulos/Anastasios-Iliopoulos.csv", local_file_path=filepath)
\ No newline at end of file
@@ -0,0 +1,61 @@
+from azure.core.exceptions import ResourceNotFoundError
+import hashlib
+import json
+import os
+import threading
+
+# Local record of what create_all.py deployed: resource id plus a hash of the arguments it was
+# created with. A re-run with the same arguments skips the long-running begin_create_or_update
+# and only does one cheap GET to make sure the resource still exists.
+STATE_FILE = os.environ.get('data_engineer_test_provisioning_state', '.provisioning_state.json')
+# Set to "0" to trust the state file without the existence check (no Azure calls at all)
+VERIFY_CACHED = os.environ.get('data_engineer_test_verify_cached_resources', '1') == '1'
+
+# Resources are created on several threads by run_dag
+state_lock = threading.Lock()
+
+def config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def state_key(kind, resource_group_name, name):
+    return f"{kind}/{resource_group_name}/{name}"
+
+def read_state(path=STATE_FILE):
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def write_state(state, path=STATE_FILE):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(state, file, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+def cached_resource_id(kind, resource_group_name, name, config, get_resource=None, path=STATE_FILE):
+    # The recorded id if the resource was created with exactly this config (and still exists), else None
+    with state_lock:
+        entry = read_state(path).get(state_key(kind, resource_group_name, name))
+    if entry is None or entry['config_hash'] != config_hash(config):
+        return None
+
+    if get_resource is not None and VERIFY_CACHED:
+        try:
+            get_resource()
+        except ResourceNotFoundError:
+            forget(kind, resource_group_name, name, path=path)
+            return None
+    return entry['id']
+
+def record(kind, resource_group_name, name, config, resource_id, path=STATE_FILE):
+    with state_lock:
+        state = read_state(path)
+        state[state_key(kind, resource_group_name, name)] = {'id': resource_id, 'config_hash': config_hash(config)}
+        write_state(state, path)
+
+def forget(kind, resource_group_name, name, path=STATE_FILE):
+    with state_lock:
+        state = read_state(path)
+        if state.pop(state_key(kind, resource_group_name, name), None) is not None:
+            write_state(state, path)
\ No newline at end of file
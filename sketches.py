@@ -0,0 +1,183 @@
+from blob_stream import DEFAULT_CHUNKSIZE
+from load_analyze_write_upload import load_blob_chunks, upload_dataframe_to_azure_storage
+import numpy as np
+import pandas as pd
+import os
+
+# Approximate per-group statistics in one streaming pass with fixed memory per group:
+# - quantiles from a log-bucket sketch (DDSketch): a value goes to bucket ceil(log_gamma(x)), so every
+#   reported quantile is within RELATIVE_ACCURACY of the true one (as a relative error);
+# - distinct counts from HyperLogLog with 2**HLL_PRECISION one-byte registers per group
+#   (standard error about 1.04 / sqrt(2**HLL_PRECISION)).
+# Both are updated a whole chunk at a time and merge exactly (bucket counts add, registers take
+# the max), so sketches of chunks, processes or worker VMs combine in any order.
+RELATIVE_ACCURACY = float(os.environ.get('data_engineer_test_sketch_relative_accuracy', '0.01'))
+HLL_PRECISION = int(os.environ.get('data_engineer_test_sketch_hll_precision', '12'))
+# Buckets kept per group; beyond that the lowest buckets are collapsed (only low quantiles lose accuracy)
+MAX_BUCKETS = 2048
+# Fixed key: the same value hashes the same in every process, which merging across workers relies on
+HLL_HASH_KEY = "hyperloglog-0001"
+# Keeps positive and negative bucket numbers apart (and away from zero) in one ordered integer
+BUCKET_BIAS = 1 << 40
+
+SKETCH_KEYS = ['Country', 'Category']
+QUANTILES = {'median_rating': 0.5, 'p90_rating': 0.9}
+
+def plain_keys(keys):
+    # Categoricals of different chunks do not share their codes
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        return keys.astype(keys.cat.categories.dtype)
+    return keys
+
+def gamma(relative_accuracy):
+    return (1 + relative_accuracy) / (1 - relative_accuracy)
+
+def value_buckets(values, relative_accuracy=RELATIVE_ACCURACY):
+    # Ordered bucket numbers: negatives < 0 == zero < positives
+    buckets = np.zeros(len(values), dtype='int64')
+    magnitude = np.abs(values)
+    nonzero = magnitude > 0
+    exponents = np.ceil(np.log(magnitude[nonzero]) / np.log(gamma(relative_accuracy))).astype('int64') + BUCKET_BIAS
+    buckets[nonzero] = np.where(values[nonzero] > 0, exponents, -exponents)
+    return buckets
+
+def bucket_values(buckets, relative_accuracy=RELATIVE_ACCURACY):
+    # Representative value of a bucket: within relative_accuracy of everything that fell into it
+    g = gamma(relative_accuracy)
+    exponents = np.abs(buckets) - BUCKET_BIAS
+    return np.where(buckets == 0, 0.0, np.sign(buckets) * 2 * g ** exponents.astype('float64') / (g + 1))
+
+def collapse_buckets(state, max_buckets=MAX_BUCKETS):
+    # Folds the lowest buckets of a group into its lowest kept bucket once it has too many
+    sizes = state.groupby(level=0).transform('size')
+    if (sizes <= max_buckets).all():
+        return state
+    buckets = state.index.get_level_values(1).to_numpy()
+    rank = state.groupby(level=0).cumcount().to_numpy()
+    excess = (sizes - max_buckets).clip(lower=0).to_numpy()
+    lowest_kept = pd.Series(np.where(rank == excess, buckets, np.iinfo('int64').min), index=state.index).groupby(level=0).transform('max').to_numpy()
+    collapsed = np.where(rank < excess, lowest_kept, buckets)
+    return state.groupby([state.index.get_level_values(0), collapsed]).sum().rename_axis(state.index.names)
+
+def quantile_sketch(df, by, column='Rating', relative_accuracy=RELATIVE_ACCURACY):
+    # Counts per (group, bucket), a Series with a two-level index
+    values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+    valid = ~np.isnan(values) & df[by].notna().to_numpy()
+    buckets = pd.DataFrame({by: plain_keys(df[by])[valid].to_numpy(), 'bucket': value_buckets(values[valid], relative_accuracy)})
+    return collapse_buckets(buckets.value_counts().sort_index())
+
+def merge_quantile_sketches(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return collapse_buckets(pd.concat([left, right]).groupby(level=[0, 1]).sum())
+
+def sketch_quantiles(state, by, quantiles=QUANTILES, relative_accuracy=RELATIVE_ACCURACY):
+    # Lower quantile (the value at rank floor(q * (count - 1))), like Series.quantile(q, interpolation='lower')
+    cumulative = state.groupby(level=0).cumsum()
+    totals = state.groupby(level=0).transform('sum')
+    result = pd.DataFrame(index=state.index.unique(level=0).rename(by))
+    for name, q in quantiles.items():
+        rank = np.floor(q * (totals - 1))
+        first = (cumulative > rank).groupby(level=0).idxmax()
+        result[name] = bucket_values(np.array([bucket for _, bucket in first.reindex(result.index)]), relative_accuracy)
+    return result
+
+def leading_zeros(words):
+    # Vectorized count of leading zero bits of uint64 values (binary search over the bit width)
+    zeros = np.zeros(len(words), dtype='uint8')
+    words = words.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = words < np.uint64(1 << (64 - shift))
+        zeros[empty] += shift
+        words[empty] <<= np.uint64(shift)
+    return zeros
+
+def value_hashes(values):
+    return pd.util.hash_pandas_object(plain_keys(values), index=False, hash_key=HLL_HASH_KEY).to_numpy()
+
+def distinct_sketch(df, by, column='Location', precision=HLL_PRECISION, hashes=None):
+    # HyperLogLog registers, one row per group and 2**precision uint8 columns.
+    # hashes: value_hashes(df[column]), to hash a chunk once for several group keys
+    hashes = value_hashes(df[column]) if hashes is None else hashes
+    valid = (df[by].notna() & df[column].notna()).to_numpy()
+    codes, groups = pd.factorize(plain_keys(df[by]), sort=True)
+    if not valid.all():
+        hashes, codes = hashes[valid], codes[valid]
+
+    # First `precision` bits pick the register, the rest give the rank of the first 1 bit;
+    # the sentinel bit caps the rank at 64 - precision + 1
+    registers_per_group = 1 << precision
+    index = (hashes >> np.uint64(64 - precision)).astype('int64')
+    rank = leading_zeros((hashes << np.uint64(precision)) | np.uint64(1 << (precision - 1))) + 1
+    registers = np.zeros(len(groups) * registers_per_group, dtype='uint8')
+    np.maximum.at(registers, codes.astype('int64') * registers_per_group + index, rank)
+    return pd.DataFrame(registers.reshape(len(groups), registers_per_group), index=pd.Index(groups, name=by))
+
+def merge_distinct_sketches(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    left, right = left.align(right, join='outer', fill_value=0)
+    return pd.DataFrame(np.maximum(left.to_numpy(), right.to_numpy()).astype('uint8'), index=left.index, columns=left.columns)
+
+def distinct_counts(state):
+    registers = state.to_numpy()
+    registers_per_group = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / registers_per_group)
+    raw = alpha * registers_per_group ** 2 / np.sum(np.exp2(-registers.astype('float64')), axis=1)
+    # Linear counting while many registers are still empty (small cardinalities)
+    empty = (registers == 0).sum(axis=1)
+    linear = registers_per_group * np.log(registers_per_group / np.maximum(empty, 1))
+    return pd.Series(np.where((raw <= 2.5 * registers_per_group) & (empty > 0), linear, raw), index=state.index)
+
+def update_sketches(sketches, df, by=SKETCH_KEYS, value_column='Rating', distinct_column='Location',
+                    relative_accuracy=RELATIVE_ACCURACY, precision=HLL_PRECISION):
+    # sketches: {key: (quantile sketch, distinct sketch)} or None
+    sketches = sketches or dict.fromkeys(by, (None, None))
+    hashes = value_hashes(df[distinct_column])
+    for key in by:
+        quantiles, distinct = sketches[key]
+        sketches[key] = (
+            merge_quantile_sketches(quantiles, quantile_sketch(df, key, value_column, relative_accuracy)),
+            merge_distinct_sketches(distinct, distinct_sketch(df, key, distinct_column, precision, hashes)),
+        )
+    return sketches
+
+def merge_sketches(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return {
+        key: (merge_quantile_sketches(left[key][0], right[key][0]), merge_distinct_sketches(left[key][1], right[key][1]))
+        for key in left
+    }
+
+def sketch_chunks(chunks, by=SKETCH_KEYS, relative_accuracy=RELATIVE_ACCURACY, precision=HLL_PRECISION):
+    sketches = None
+    for chunk in chunks:
+        sketches = update_sketches(sketches, chunk, by=by, relative_accuracy=relative_accuracy, precision=precision)
+    return sketches
+
+def approximate_statistics(sketches, by='Country', relative_accuracy=RELATIVE_ACCURACY):
+    # SQL Equivalent (approximately):
+    # SELECT Country, MEDIAN(Rating) as median_rating, PERCENTILE(Rating, 0.9) as p90_rating,
+    #        COUNT(DISTINCT Location) as distinct_locations
+    # FROM tourism_dataset GROUP BY Country;
+    # Groups whose ratings are all missing only show up in the distinct count
+    quantiles, distinct = sketches[by]
+    result = sketch_quantiles(quantiles, by, relative_accuracy=relative_accuracy).reindex(distinct.index.union(quantiles.index.unique(level=0)))
+    result['distinct_locations'] = distinct_counts(distinct).reindex(result.index).fillna(0).round().astype('int64')
+    result.index.name = by
+    return result.reset_index()
+
+if __name__ == "__main__":
+    chunks = load_blob_chunks(container_name="raw", blob_name="tourism_dataset.csv", chunksize=DEFAULT_CHUNKSIZE, usecols=SKETCH_KEYS + ['Location', 'Rating'])
+    sketches = sketch_chunks(chunks)
+    for key in SKETCH_KEYS:
+        statistics = approximate_statistics(sketches, by=key)
+        print(statistics)
+        upload_dataframe_to_azure_storage(statistics, container_name="anastasios-iliopoulos", blob_name=f"Anastasios-Iliopoulos/approximate-statistics-by-{key.lower()}.csv")
\ No newline at end of file
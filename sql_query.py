@@ -0,0 +1,118 @@
+from blob_cache import cached_blob_path
+from instrumentation import annotate, stage
+from load_analyze_write_upload import refresh_parquet_cache
+from tourism_schema import FALSE_VALUES, TRUE_VALUES
+import duckdb
+import argparse
+import os
+import traceback
+
+# Ad-hoc SQL over the raw data with DuckDB (embedded, multi-threaded, columnar). The blob is read
+# from the local blob cache, preferably as its cached Parquet copy: DuckDB then reads only the
+# columns a query uses, and skips row groups whose min/max statistics rule out its WHERE clause.
+# The SQL equivalents in the comments of aggregate_data/aggregate_and_get_top run as they are, e.g.
+#   python sql_query.py "SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset GROUP BY Country"
+# DuckDB's AVG is a plain floating-point sum, so it can differ from aggregate_data's correctly rounded
+# averages in the last digits.
+TABLE_NAME = "tourism_dataset"
+SQL_THREADS = int(os.environ.get('data_engineer_test_sql_threads', str(os.cpu_count() or 1)))
+# e.g. "1GB"; larger sorts and aggregations spill to disk instead of failing. None: DuckDB's default
+SQL_MEMORY_LIMIT = os.environ.get('data_engineer_test_sql_memory_limit')
+
+# Same types as tourism_schema.TOURISM_DTYPES, for reading the CSV directly
+CSV_COLUMNS = {
+    'Location': 'VARCHAR',
+    'Country': 'VARCHAR',
+    'Category': 'VARCHAR',
+    'Visitors': 'UINTEGER',
+    'Rating': 'DOUBLE',
+    'Revenue': 'DOUBLE',
+    'Accommodation_Available': 'VARCHAR',
+}
+
+def sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def connect(threads=SQL_THREADS, memory_limit=SQL_MEMORY_LIMIT):
+    connection = duckdb.connect()
+    try:
+        connection.execute(f"SET threads TO {int(threads)}")
+        if memory_limit is not None:
+            connection.execute(f"SET memory_limit = {sql_literal(memory_limit)}")
+    except Exception:
+        connection.close()
+        raise
+    return connection
+
+def source_relation(paths, file_format):
+    paths_sql = "[" + ", ".join(sql_literal(path) for path in paths) + "]"
+    if file_format == 'parquet':
+        return f"read_parquet({paths_sql})"
+    columns_sql = "{" + ", ".join(f"{sql_literal(column)}: {sql_literal(column_type)}" for column, column_type in CSV_COLUMNS.items()) + "}"
+    # The flag column is text in the file ("Yes"/"No"); the view exposes it as BOOLEAN like the typed parse
+    return (
+        f"(SELECT * REPLACE (CASE WHEN Accommodation_Available IN ({', '.join(map(sql_literal, TRUE_VALUES))}) THEN TRUE "
+        f"WHEN Accommodation_Available IN ({', '.join(map(sql_literal, FALSE_VALUES))}) THEN FALSE END AS Accommodation_Available) "
+        f"FROM read_csv({paths_sql}, header = true, columns = {columns_sql}))"
+    )
+
+def register_view(connection, paths, file_format='parquet', table_name=TABLE_NAME):
+    if file_format not in ('parquet', 'csv'):
+        raise ValueError(f"Unsupported format: {file_format}. Choose from ('parquet', 'csv').")
+    connection.execute(f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM {source_relation(paths, file_format)}")
+    return connection
+
+def local_source_paths(container_name, blob_names, file_format='parquet'):
+    # Local copies of the current blobs (or of their Parquet copies), downloaded only when changed
+    paths = []
+    for blob_name in blob_names:
+        if file_format == 'parquet':
+            blob_name = refresh_parquet_cache(container_name, blob_name)
+        path, _ = cached_blob_path(container_name, blob_name)
+        paths.append(path)
+    return paths
+
+def run_query(sql, container_name="raw", blob_names=("tourism_dataset.csv",), file_format='parquet', local_paths=None,
+              threads=SQL_THREADS, memory_limit=SQL_MEMORY_LIMIT):
+    # Runs `sql` against the view tourism_dataset and returns the result as a DataFrame.
+    # local_paths: query these files instead of the cached blobs (same file_format for all)
+    try:
+        paths = list(local_paths) if local_paths is not None else local_source_paths(container_name, blob_names, file_format)
+        with stage("sql_query", format=file_format), connect(threads, memory_limit) as connection:
+            df = register_view(connection, paths, file_format).execute(sql).df()
+            annotate(rows=len(df))
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return df
+
+def explain_query(sql, container_name="raw", blob_names=("tourism_dataset.csv",), file_format='parquet', local_paths=None):
+    # Physical plan; the scan node lists the projected columns and the filters pushed into it
+    paths = list(local_paths) if local_paths is not None else local_source_paths(container_name, blob_names, file_format)
+    with connect() as connection:
+        plan = "\n".join(row[1] for row in register_view(connection, paths, file_format).execute(f"EXPLAIN {sql}").fetchall())
+    return plan
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Run SQL against the view '{TABLE_NAME}' over the raw data.")
+    parser.add_argument("sql")
+    parser.add_argument("--container", default="raw")
+    parser.add_argument("--blob", action="append", default=None, help="raw CSV blob (repeatable, default tourism_dataset.csv)")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet", help="scan the cached Parquet copy or the CSV")
+    parser.add_argument("--local", action="append", default=None, help="query this local file instead of a blob (repeatable)")
+    parser.add_argument("--threads", type=int, default=SQL_THREADS)
+    parser.add_argument("--explain", action="store_true", help="print the plan instead of running the query")
+    parser.add_argument("--output", default=None, help="also write the result to this CSV file")
+    args = parser.parse_args()
+
+    blob_names = args.blob or ["tourism_dataset.csv"]
+    if args.explain:
+        print(explain_query(args.sql, args.container, blob_names, args.format, args.local))
+    else:
+        result = run_query(args.sql, args.container, blob_names, args.format, args.local, threads=args.threads)
+        print(result.to_string(index=False))
+        if args.output is not None:
+            result.to_csv(os.path.join(".", os.path.normpath(args.output)), index=False)
\ No newline at end of file
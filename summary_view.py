@@ -0,0 +1,192 @@
+from azure.core.exceptions import ResourceNotFoundError
+from azure_clients import get_blob_service_client, get_or_create_container_client
+from aggregation import aggregate_chunks, empty_state, finalize_average, merge_all, merge_partials, top_n_from_state, update_state
+from blob_stream import DEFAULT_CHUNKSIZE
+from load_analyze_write_upload import load_blob_chunks
+import pandas as pd
+import io
+import json
+import traceback
+
+# Materialized view over the CSV blobs of a raw container: per-blob partial states for every summary
+# key, merged into one small table per key. Queries read the merged table (O(groups)) as long as the
+# manifest of source ETags matches the container; refreshes only re-read blobs that are new or changed.
+SUMMARY_CONTAINER = "summaries"
+SUMMARY_KEYS = ['Country', 'Category']
+# measure name -> (source column, optional stats kept besides count/sum)
+SUMMARY_MEASURES = {
+    'rating': ('Rating', ('min', 'max')),
+    'visitors': ('Visitors', ()),
+    'revenue': ('Revenue', ()),
+}
+SUMMARY_COLUMNS = SUMMARY_KEYS + [column for column, _ in SUMMARY_MEASURES.values()]
+
+def blob_summary_name(container_name, blob_name, key):
+    return f"blobs/{container_name}/{blob_name}/{key}.csv"
+
+def view_name(container_name, prefix, key):
+    return f"views/{container_name}/{prefix or '_all'}/{key}.csv"
+
+def manifest_name(container_name, prefix):
+    return f"views/{container_name}/{prefix or '_all'}/manifest.json"
+
+def combine_measures(states, key):
+    # {measure: state} -> one frame with rating_count, rating_sum, ..., revenue_sum_error columns.
+    # A measure without rows (no CSV blobs, header-only blobs) still gets its columns.
+    frames = []
+    for measure, state in states.items():
+        if state is None:
+            state = empty_state(key)
+            for stat in SUMMARY_MEASURES[measure][1]:
+                state[stat] = pd.Series(dtype='float64')
+        frames.append(state.add_prefix(f"{measure}_"))
+    combined = pd.concat(frames, axis=1)
+    combined.index.name = key
+    return combined
+
+def split_measures(combined):
+    states = {}
+    for measure in SUMMARY_MEASURES:
+        columns = [column for column in combined.columns if column.startswith(f"{measure}_")]
+        state = combined[columns].rename(columns=lambda column: column[len(measure) + 1:])
+        state['count'] = state['count'].fillna(0).astype('int64')
+        states[measure] = state
+    return states
+
+def state_to_csv(combined):
+    return combined.reset_index().to_csv(index=False).encode("utf-8")
+
+def state_from_csv(data, key):
+    # round_trip keeps the sum/sum_error pairs bit-exact
+    combined = pd.read_csv(io.BytesIO(data), dtype={key: 'str'}, keep_default_na=False, na_values=[''], float_precision='round_trip')
+    return combined.set_index(key)
+
+def list_source_blobs(container_name, prefix):
+    container_client = get_blob_service_client().get_container_client(container_name)
+    return {blob.name: blob.etag.strip('"') for blob in container_client.list_blobs(name_starts_with=prefix) if blob.name.endswith('.csv')}
+
+def read_manifest(container_name, prefix):
+    blob_client = get_blob_service_client().get_blob_client(SUMMARY_CONTAINER, manifest_name(container_name, prefix))
+    try:
+        return json.loads(blob_client.download_blob().readall())
+    except ResourceNotFoundError:
+        return None
+
+def summarize_blob(container_name, blob_name, chunksize=DEFAULT_CHUNKSIZE):
+    # One streaming pass over the raw blob fills every (key, measure) state
+    states = {(key, measure): None for key in SUMMARY_KEYS for measure in SUMMARY_MEASURES}
+    for chunk in load_blob_chunks(container_name, blob_name, chunksize=chunksize, usecols=SUMMARY_COLUMNS):
+        for key in SUMMARY_KEYS:
+            for measure, (column, stats) in SUMMARY_MEASURES.items():
+                states[key, measure] = update_state(states[key, measure], chunk, by=key, column=column, stats=stats)
+    return {key: combine_measures({measure: states[key, measure] for measure in SUMMARY_MEASURES}, key) for key in SUMMARY_KEYS}
+
+def refresh_blob_summary(summary_container_client, container_name, blob_name, etag, chunksize=DEFAULT_CHUNKSIZE):
+    # Per-blob summaries are shared by every view over the container; their source ETag is kept in
+    # the blob metadata so a summary that is already current is not computed twice.
+    summary_clients = {key: summary_container_client.get_blob_client(blob_summary_name(container_name, blob_name, key)) for key in SUMMARY_KEYS}
+    try:
+        if all(client.get_blob_properties().metadata.get('source_etag') == etag for client in summary_clients.values()):
+            return False
+    except ResourceNotFoundError:
+        pass
+
+    summaries = summarize_blob(container_name, blob_name, chunksize=chunksize)
+    for key, client in summary_clients.items():
+        client.upload_blob(state_to_csv(summaries[key]), overwrite=True, metadata={'source_etag': etag})
+    return True
+
+def refresh_summary_view(container_name, prefix="", chunksize=DEFAULT_CHUNKSIZE):
+    # Incremental: only blobs whose ETag is not in the manifest are read again, then the per-blob
+    # summaries (a few rows each) are merged into the view. The manifest is written last, so a
+    # failed refresh leaves the view marked stale rather than half-updated.
+    try:
+        summary_container_client = get_or_create_container_client(SUMMARY_CONTAINER)
+        current = list_source_blobs(container_name, prefix)
+        manifest = read_manifest(container_name, prefix) or {'blobs': {}}
+
+        changed = [blob_name for blob_name, etag in current.items() if manifest['blobs'].get(blob_name) != etag]
+        for blob_name in changed:
+            refresh_blob_summary(summary_container_client, container_name, blob_name, current[blob_name], chunksize=chunksize)
+        removed = set(manifest['blobs']) - set(current)
+
+        if changed or removed or manifest['blobs'] == {}:
+            for key in SUMMARY_KEYS:
+                merged = {measure: None for measure in SUMMARY_MEASURES}
+                for blob_name in current:
+                    data = summary_container_client.get_blob_client(blob_summary_name(container_name, blob_name, key)).download_blob().readall()
+                    for measure, state in split_measures(state_from_csv(data, key)).items():
+                        merged[measure] = merge_partials(merged[measure], state)
+                summary_container_client.get_blob_client(view_name(container_name, prefix, key)).upload_blob(
+                    state_to_csv(combine_measures(merged, key)), overwrite=True
+                )
+            summary_container_client.get_blob_client(manifest_name(container_name, prefix)).upload_blob(
+                json.dumps({'blobs': current}), overwrite=True
+            )
+        print(f"Summary view of '{container_name}/{prefix}' refreshed: {len(changed)} changed, {len(removed)} removed, {len(current)} blobs.")
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred:")
+        print(error_message)
+        # Logging in production
+        raise e
+    return current
+
+def is_fresh(container_name, prefix=""):
+    # One listing call; fresh means the view was built from exactly the blobs (and versions) there now
+    manifest = read_manifest(container_name, prefix)
+    return manifest is not None and manifest['blobs'] == list_source_blobs(container_name, prefix)
+
+def load_view(container_name, prefix="", by='Country'):
+    data = get_blob_service_client().get_blob_client(SUMMARY_CONTAINER, view_name(container_name, prefix, by)).download_blob().readall()
+    return split_measures(state_from_csv(data, by))
+
+def raw_rating_state(container_name, prefix="", by='Country', chunksize=DEFAULT_CHUNKSIZE):
+    # Fallback: full scan of the raw blobs
+    return merge_all(
+        aggregate_chunks(load_blob_chunks(container_name, blob_name, chunksize=chunksize, usecols=[by, 'Rating']), by=by)
+        for blob_name in list_source_blobs(container_name, prefix)
+    )
+
+def rating_state(container_name, prefix="", by='Country', refresh_if_stale=True):
+    # Routes to the view when it is fresh (or can be refreshed incrementally), else to the raw data
+    if by not in SUMMARY_KEYS:
+        return raw_rating_state(container_name, prefix=prefix, by=by)
+    if not is_fresh(container_name, prefix):
+        if not refresh_if_stale:
+            print(f"Summary view of '{container_name}/{prefix}' is stale, reading the raw blobs.")
+            return raw_rating_state(container_name, prefix=prefix, by=by)
+        refresh_summary_view(container_name, prefix=prefix)
+    return load_view(container_name, prefix=prefix, by=by)['rating'][['count', 'sum', 'sum_error']]
+
+def summary_aggregate_data(container_name, prefix="", by='Country', refresh_if_stale=True):
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Country;
+    return finalize_average(rating_state(container_name, prefix=prefix, by=by, refresh_if_stale=refresh_if_stale), by=by)
+
+def summary_aggregate_and_get_top(container_name, n_top, prefix="", by='Country', refresh_if_stale=True):
+    # SQL Equivalent:
+    # SELECT Country, AVG(Rating) as average_rating FROM tourism_dataset
+    # GROUP BY Country
+    # ORDER BY average_rating DESC LIMIT 3;
+    return top_n_from_state(rating_state(container_name, prefix=prefix, by=by, refresh_if_stale=refresh_if_stale), n_top, by=by)
+
+def summary_table(container_name, prefix="", by='Country'):
+    # SQL Equivalent:
+    # SELECT Country, COUNT(Rating), AVG(Rating), MIN(Rating), MAX(Rating), SUM(Visitors), SUM(Revenue)
+    # FROM tourism_dataset GROUP BY Country;
+    if not is_fresh(container_name, prefix):
+        refresh_summary_view(container_name, prefix=prefix)
+    states = load_view(container_name, prefix=prefix, by=by)
+    table = finalize_average(states['rating'], by=by).set_index(by)
+    table.insert(0, 'count', states['rating']['count'])
+    table['total_visitors'] = states['visitors']['sum'] + states['visitors']['sum_error']
+    table['total_revenue'] = states['revenue']['sum'] + states['revenue']['sum_error']
+    return table.reset_index()
+
+if __name__ == "__main__":
+    # Run after new raw blobs have landed; later queries only touch the summary
+    refresh_summary_view(container_name="raw")
+    print(summary_table(container_name="raw"))
+    print(summary_aggregate_and_get_top(container_name="raw", n_top=3))
\ No newline at end of file
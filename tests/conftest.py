@@ -0,0 +1,25 @@
+import os
+import sys
+
+# The scripts live in the repository root and import each other by module name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from azure_clients import set_async_blob_service_client, set_blob_service_client
+from fake_blob_storage import AsyncFakeBlobServiceClient, FakeBlobServiceClient
+import pytest
+
+@pytest.fixture
+def blob_storage(tmp_path):
+    # Filesystem-backed blob storage under tmp_path; returns a function that writes a blob
+    root = tmp_path / "storage"
+    set_blob_service_client(FakeBlobServiceClient(str(root)))
+    set_async_blob_service_client(AsyncFakeBlobServiceClient(str(root)))
+
+    def put_blob(container_name, blob_name, data):
+        path = root / container_name / blob_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data.encode() if isinstance(data, str) else data)
+
+    yield put_blob
+    set_blob_service_client(None)
+    set_async_blob_service_client(None)
\ No newline at end of file
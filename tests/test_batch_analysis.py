@@ -0,0 +1,22 @@
+from aggregation import aggregate_chunks, merge_all, top_n_from_state
+from batch_analysis import batch_aggregate_and_get_top
+from load_analyze_write_upload import load_blob_chunks
+from tourism_schema import AGGREGATE_COLUMNS
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+
+def test_batch_matches_the_per_blob_sync_aggregation(blob_storage):
+    blob_names = []
+    for day in range(4):
+        rows = "".join(f"loc{i},Country{(i + day) % 5},Nature,{i},{1 + (i * 31 + day) % 400 / 100},{i}.5,Yes\n" for i in range(300))
+        blob_storage("raw", f"daily/day-{day}.csv", HEADER + rows)
+        blob_names.append(f"daily/day-{day}.csv")
+    blob_storage("raw", "daily/notes.txt", "not a csv")
+    blob_storage("raw", "other/day-9.csv", HEADER + "x,Country9,Nature,1,5.0,1.0,Yes\n")
+
+    top = batch_aggregate_and_get_top("raw", "daily/", 3)
+
+    expected = top_n_from_state(merge_all(
+        aggregate_chunks(load_blob_chunks("raw", blob_name, usecols=AGGREGATE_COLUMNS)) for blob_name in blob_names
+    ), 3)
+    assert top.equals(expected)
\ No newline at end of file
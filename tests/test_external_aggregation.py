@@ -0,0 +1,22 @@
+from external_aggregation import write_external_aggregate_csv
+import pandas as pd
+
+def test_csv_matches_the_in_memory_average(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chunks = [
+        pd.DataFrame({'Location': ['a', 'b', 'c'], 'Rating': [1.0, 2.0, 3.0]}),
+        pd.DataFrame({'Location': ['a', 'c', None], 'Rating': [3.0, 4.0, 5.0]}),
+    ]
+    path = write_external_aggregate_csv(iter(chunks), "by-location.csv")
+
+    result = pd.read_csv(path).sort_values('Location', ignore_index=True)
+    expected = pd.concat(chunks).groupby('Location', as_index=False)['Rating'].mean().rename(columns={'Rating': 'average_rating'})
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_empty_input_writes_the_header(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = write_external_aggregate_csv(iter([]), "by-location.csv")
+
+    result = pd.read_csv(path)
+    assert list(result.columns) == ['Location', 'average_rating']
+    assert result.empty
\ No newline at end of file
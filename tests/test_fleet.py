@@ -0,0 +1,30 @@
+from fleet import reduce_partials, run_worker
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+ROWS = [
+    "kdLmOjQ,Nigeria,Nature,948853,1.32,84388.38,Yes\n",
+    "rDfyfBy,Egypt,Historical,813627,2.01,802625.6,No\n",
+    "ZfJXuXZ,France,Beach,508673,4.42,338777.11,Yes\n",
+    "wLlfRfi,Nigeria,Urban,623329,3.5,295183.6,No\n",
+]
+
+def test_empty_shard_uploads_an_empty_partial(blob_storage):
+    blob_storage("raw", "daily/full.csv", HEADER + "".join(ROWS))
+    blob_storage("raw", "daily/empty.csv", HEADER)
+
+    run_worker({'container': "raw", 'blobs': ["daily/full.csv"]}, "run", 0)
+    run_worker({'container': "raw", 'blobs': ["daily/empty.csv"]}, "run", 1)
+
+    top = reduce_partials("run", 2, 3)
+    assert top['Country'].tolist() == ['France', 'Nigeria', 'Egypt']
+    assert top['average_rating'].tolist() == [4.42, (1.32 + 3.5) / 2, 2.01]
+
+def test_only_empty_shards_give_an_empty_result(blob_storage):
+    blob_storage("raw", "daily/empty.csv", HEADER)
+
+    run_worker({'container': "raw", 'blobs': ["daily/empty.csv"]}, "run", 0)
+    run_worker({'container': "raw", 'blobs': []}, "run", 1)
+
+    top = reduce_partials("run", 2, 3)
+    assert top.empty
+    assert list(top.columns) == ['Country', 'average_rating']
\ No newline at end of file
@@ -0,0 +1,40 @@
+import instrumentation
+from instrumentation import stage
+import threading
+
+def test_concurrent_stages_do_not_reset_each_others_peak(monkeypatch):
+    resets = []
+    monkeypatch.setattr(instrumentation, 'reset_peak_rss', lambda: resets.append(1) or True)
+    started = threading.Event()
+    release = threading.Event()
+    records = {}
+
+    def upload():
+        with stage("upload") as record:
+            records['upload'] = record
+            started.set()
+            release.wait()
+
+    thread = threading.Thread(target=upload)
+    thread.start()
+    started.wait()
+    # Another thread's stage is running: the peak is left alone and reported as process-wide
+    with stage("aggregate") as record:
+        with stage("write") as inner:
+            pass
+    release.set()
+    thread.join()
+
+    assert len(resets) == 1
+    assert records['upload']['peak_rss_scope'] == 'stage'
+    assert record['peak_rss_scope'] == 'process'
+    assert inner['peak_rss_scope'] == 'process'
+
+    # Nested stages of a single thread still get their own peak
+    with stage("aggregate") as record:
+        with stage("write") as inner:
+            pass
+    assert len(resets) == 3
+    assert record['peak_rss_scope'] == 'stage'
+    assert inner['peak_rss_scope'] == 'stage'
+    assert instrumentation.running_stage_count == 0
\ No newline at end of file
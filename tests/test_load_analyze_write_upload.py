@@ -0,0 +1,34 @@
+from load_analyze_write_upload import load_blob_chunks
+import pandas as pd
+import pytest
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+ROWS = "".join(f"loc{i},Country{i % 3},Nature,{i},{1 + i % 5}.0,{i}.5,Yes\n" for i in range(10))
+
+def test_load_blob_chunks_saves_a_complete_copy(blob_storage, tmp_path, monkeypatch, capsys):
+    blob_storage("raw", "tourism_dataset.csv", HEADER + ROWS)
+    monkeypatch.chdir(tmp_path)
+
+    chunks = list(load_blob_chunks("raw", "tourism_dataset.csv", chunksize=4, save_local_path="copy.csv"))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert pd.concat(chunks)['Rating'].tolist() == [1 + i % 5 for i in range(10)]
+    assert (tmp_path / "copy.csv").read_text() == HEADER + ROWS
+    assert "Blob downloaded to" in capsys.readouterr().out
+
+def test_load_blob_chunks_closed_early_reports_no_copy(blob_storage, tmp_path, monkeypatch, capsys):
+    blob_storage("raw", "tourism_dataset.csv", HEADER + ROWS)
+    monkeypatch.chdir(tmp_path)
+
+    chunks = load_blob_chunks("raw", "tourism_dataset.csv", chunksize=4, save_local_path="copy.csv")
+    next(chunks)
+    chunks.close()
+    assert "Blob downloaded to" not in capsys.readouterr().out
+    assert list(tmp_path.glob("copy.csv*")) == []
+
+def test_load_blob_chunks_failed_download_leaves_no_copy(blob_storage, tmp_path, monkeypatch):
+    blob_storage("raw", "tourism_dataset.csv", HEADER + ROWS + "broken,\"unterminated\n")
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(Exception):
+        list(load_blob_chunks("raw", "tourism_dataset.csv", chunksize=4, save_local_path="copy.csv"))
+    assert list(tmp_path.glob("copy.csv*")) == []
\ No newline at end of file
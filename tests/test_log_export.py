@@ -0,0 +1,98 @@
+from fake_logs_query import FakeLogsQueryClient
+from log_export import export_logs, read_checkpoint, resource_query
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta, timezone
+import os
+import pytest
+
+START = datetime(2026, 10, 17, 22, 30, tzinfo=timezone.utc)
+END = START + timedelta(hours=4)
+QUERY = resource_query("Syslog", "vm1")
+
+@pytest.fixture
+def events():
+    # 4,000 events spread over the window plus a burst of 3,000 in two minutes after midnight
+    rng = np.random.default_rng(0)
+    offsets = np.concatenate([rng.uniform(0, 4 * 3600, 4000), 5400 + rng.uniform(0, 120, 3000)])
+    times = pd.Series(pd.DatetimeIndex(START + pd.to_timedelta(offsets, unit='s')).floor('us'))
+    # One event exactly on an initial slice boundary
+    times.iloc[0] = datetime(2026, 10, 18, 0, 0, tzinfo=timezone.utc)
+    return pd.DataFrame({
+        'TimeGenerated': times,
+        'EventId': np.arange(len(times)),
+        'ResourceId': "vm1",
+        'Computer': rng.choice(["a", "b"], len(times)),
+    })
+
+class FailingLogsQueryClient(FakeLogsQueryClient):
+    # Fails every query after the first `fail_after`, like a network outage in the middle of a run
+    def __init__(self, events, fail_after, **kwargs):
+        super().__init__(events, **kwargs)
+        self.fail_after = fail_after
+
+    def query_workspace(self, workspace_id, query, *, timespan, **kwargs):
+        if len(self.queries) >= self.fail_after:
+            raise RuntimeError("Connection reset")
+        return super().query_workspace(workspace_id, query, timespan=timespan, **kwargs)
+
+def exported_event_ids(export_dir):
+    return sorted(pq.read_table(export_dir).column('EventId').to_pylist())
+
+def part_files(export_dir):
+    return sorted(
+        os.path.relpath(os.path.join(directory, file_name), export_dir)
+        for directory, _, file_names in os.walk(export_dir) for file_name in file_names if file_name.startswith("part-")
+    )
+
+def test_large_slices_are_split_and_every_event_is_exported_once(events, tmp_path):
+    export_dir = str(tmp_path / "logs")
+    client = FakeLogsQueryClient(events, max_rows=5000)
+
+    rows = export_logs(QUERY, START, END, export_dir=export_dir, workspace_id="workspace", client=client, max_rows=1000)
+
+    assert rows == len(events)
+    assert exported_event_ids(export_dir) == list(range(len(events)))
+    # 5 initial slices (22:30 to 02:30 on the hour grid); the burst forces further splits
+    assert len(client.queries) > 5
+    assert {os.path.dirname(path) for path in part_files(export_dir)} == {"date=2026-10-17", "date=2026-10-18"}
+    assert sorted(read_checkpoint(export_dir, QUERY)['completed'])[0][0] == START
+
+def test_failed_run_resumes_without_querying_finished_slices(events, tmp_path):
+    export_dir = str(tmp_path / "logs")
+    failing_client = FailingLogsQueryClient(events, fail_after=6, max_rows=5000)
+    with pytest.raises(RuntimeError):
+        export_logs(QUERY, START, END, export_dir=export_dir, workspace_id="workspace", client=failing_client, max_rows=1000, max_workers=2)
+    completed = read_checkpoint(export_dir, QUERY)['completed']
+    assert 0 < len(completed) < 6
+
+    client = FakeLogsQueryClient(events, max_rows=5000)
+    rows = export_logs(QUERY, START, END, export_dir=export_dir, workspace_id="workspace", client=client, max_rows=1000)
+
+    assert exported_event_ids(export_dir) == list(range(len(events)))
+    assert rows == len(events) - sum(((events['TimeGenerated'] >= start) & (events['TimeGenerated'] < end)).sum() for start, end in completed)
+    for query_start, query_end in client.queries:
+        assert all(query_end <= start or query_start >= end for start, end in completed)
+
+def test_unrecorded_part_files_are_removed(events, tmp_path):
+    export_dir = str(tmp_path / "logs")
+    export_logs(QUERY, START, END, export_dir=export_dir, workspace_id="workspace", client=FakeLogsQueryClient(events), max_rows=1000)
+    recorded = part_files(export_dir)
+
+    # A part written by a run that stopped before its checkpoint update, holding rows of a recorded slice
+    orphan = os.path.join(export_dir, "date=2026-10-18", "part-20261018T000000000000-20261018T003000000000.parquet")
+    assert os.path.relpath(orphan, export_dir) not in recorded
+    pq.write_table(pq.read_table(os.path.join(export_dir, recorded[-1])), orphan)
+    rows = export_logs(QUERY, START, END, export_dir=export_dir, workspace_id="workspace", client=FakeLogsQueryClient(events), max_rows=1000)
+
+    assert rows == 0
+    assert part_files(export_dir) == recorded
+    assert exported_event_ids(export_dir) == list(range(len(events)))
+
+def test_export_dir_of_another_query_is_refused(events, tmp_path):
+    export_dir = str(tmp_path / "logs")
+    export_logs(QUERY, START, END, export_dir=export_dir, workspace_id="workspace", client=FakeLogsQueryClient(events), max_rows=1000)
+
+    with pytest.raises(ValueError):
+        export_logs(resource_query("Syslog", "vm2"), START, END, export_dir=export_dir, workspace_id="workspace", client=FakeLogsQueryClient(events))
\ No newline at end of file
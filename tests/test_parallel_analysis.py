@@ -0,0 +1,41 @@
+from azure_clients import get_blob_client
+from load_analyze_write_upload import aggregate_and_get_top
+from parallel_analysis import parallel_aggregate, parallel_aggregate_and_get_top, split_byte_ranges
+from tourism_schema import read_tourism_csv
+import io
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+ROWS = [
+    "kdLmOjQ,Nigeria,Nature,948853,1.32,84388.38,Yes\n",
+    "rDfyfBy,Egypt,Historical,813627,2.01,802625.6,No\n",
+    "ZfJXuXZ,France,Beach,508673,4.42,338777.11,Yes\n",
+    "wLlfRfi,Nigeria,Urban,623329,3.5,295183.6,No\n",
+]
+
+def test_split_byte_ranges_covers_every_row(blob_storage):
+    data = HEADER + "".join(ROWS)
+    blob_storage("raw", "tourism_dataset.csv", data)
+    columns, byte_ranges = split_byte_ranges(get_blob_client("raw", "tourism_dataset.csv"), 3)
+
+    assert columns == HEADER.strip().split(",")
+    assert byte_ranges[0][0] == len(HEADER)
+    assert "".join(data[offset:offset + length] for offset, length in byte_ranges) == "".join(ROWS)
+
+def test_header_only_blob_gives_an_empty_result(blob_storage):
+    blob_storage("raw", "tourism_dataset.csv", HEADER)
+
+    state = parallel_aggregate("raw", "tourism_dataset.csv", pool_size=2)
+    assert state.empty
+    assert list(state.columns) == ['count', 'sum', 'sum_error']
+
+    top = parallel_aggregate_and_get_top("raw", "tourism_dataset.csv", 3, pool_size=2)
+    assert top.empty
+    assert list(top.columns) == ['Country', 'average_rating']
+def test_pool_result_matches_the_single_process_aggregation(blob_storage):
+    rows = [f"loc{i},Country{i % 7},Nature,{i},{1 + (i * 37 % 400) / 100},{i}.5,Yes\n" for i in range(2000)]
+    blob_storage("raw", "tourism_dataset.csv", HEADER + "".join(rows))
+    expected = aggregate_and_get_top(read_tourism_csv(io.StringIO(HEADER + "".join(rows))), 3)
+
+    top = parallel_aggregate_and_get_top("raw", "tourism_dataset.csv", 3, pool_size=2, n_ranges=5)
+
+    assert top.equals(expected)
\ No newline at end of file
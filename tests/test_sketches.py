@@ -0,0 +1,36 @@
+from sketches import RELATIVE_ACCURACY, approximate_statistics, merge_sketches, sketch_chunks
+import numpy as np
+import pandas as pd
+
+def tourism_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Country': rng.choice(['Egypt', 'France', 'Japan'], rows),
+        'Category': rng.choice(['Beach', 'Urban'], rows),
+        'Location': rng.integers(0, 500, rows).astype('str'),
+        # Ratings spread over a few orders of magnitude so that many buckets are used
+        'Rating': rng.lognormal(1.0, 1.5, rows),
+    })
+
+def chunked(df, size):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+def test_quantiles_are_within_the_relative_accuracy():
+    df = tourism_frame(20000)
+    statistics = approximate_statistics(sketch_chunks(chunked(df, 3000)), by='Country').set_index('Country')
+
+    grouped = df.groupby('Country')['Rating']
+    for name, q in {'median_rating': 0.5, 'p90_rating': 0.9}.items():
+        exact = grouped.quantile(q, interpolation='lower')
+        relative_error = ((statistics[name] - exact).abs() / exact).max()
+        assert relative_error <= RELATIVE_ACCURACY
+    distinct = df.groupby('Country')['Location'].nunique()
+    assert ((statistics['distinct_locations'] - distinct).abs() / distinct).max() < 0.05
+
+def test_result_does_not_depend_on_chunking_or_merge_order():
+    df = tourism_frame(9000, seed=1)
+    whole = approximate_statistics(sketch_chunks([df]), by='Category')
+    parts = [sketch_chunks(chunked(part, 700)) for part in chunked(df, 4000)]
+
+    pd.testing.assert_frame_equal(approximate_statistics(merge_sketches(merge_sketches(parts[0], parts[1]), parts[2]), by='Category'), whole)
+    pd.testing.assert_frame_equal(approximate_statistics(merge_sketches(parts[2], merge_sketches(parts[1], parts[0])), by='Category'), whole)
\ No newline at end of file
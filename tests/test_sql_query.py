@@ -0,0 +1,44 @@
+import sql_query
+from sql_query import explain_query, run_query
+import duckdb
+import pytest
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "tourism_dataset.csv"
+    path.write_text(HEADER + "a,France,Beach,10,3.0,1.0,Yes\nb,France,Urban,20,5.0,2.0,No\nc,Egypt,Urban,30,2.0,1.0,No\n")
+    return str(path)
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def recording_connect(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+    connect = sql_query.connect
+    monkeypatch.setattr(sql_query, 'connect', recording_connect)
+    return opened
+
+def is_closed(connection):
+    try:
+        connection.execute("SELECT 1")
+    except duckdb.ConnectionException:
+        return True
+    return False
+
+def test_query_runs_against_the_csv(csv_path, connections):
+    result = run_query("SELECT Country, AVG(Rating) AS average_rating FROM tourism_dataset GROUP BY Country ORDER BY Country",
+                       file_format='csv', local_paths=[csv_path])
+    assert result.to_dict('list') == {'Country': ['Egypt', 'France'], 'average_rating': [2.0, 4.0]}
+    assert all(is_closed(connection) for connection in connections)
+
+def test_failed_query_closes_the_connection(csv_path, connections):
+    with pytest.raises(duckdb.Error):
+        run_query("SELECT Missing FROM tourism_dataset", file_format='csv', local_paths=[csv_path])
+    with pytest.raises(duckdb.Error):
+        explain_query("SELECT Missing FROM tourism_dataset", file_format='csv', local_paths=[csv_path])
+    assert len(connections) == 2
+    assert all(is_closed(connection) for connection in connections)
\ No newline at end of file
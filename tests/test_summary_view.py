@@ -0,0 +1,24 @@
+from summary_view import SUMMARY_MEASURES, load_view, refresh_summary_view, summary_aggregate_and_get_top, summary_table
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+
+def test_view_over_an_empty_prefix_has_the_measure_columns(blob_storage):
+    blob_storage("raw", "2026/day-1.csv", HEADER + "a,France,Beach,10,3.0,1.0,Yes\n")
+
+    assert refresh_summary_view("raw", prefix="2025/") == {}
+    states = load_view("raw", prefix="2025/", by='Category')
+    assert set(states) == set(SUMMARY_MEASURES)
+    assert list(states['rating'].columns) == ['count', 'sum', 'sum_error', 'min', 'max']
+    assert states['rating'].empty
+    assert summary_table("raw", prefix="2025/").empty
+    assert summary_aggregate_and_get_top("raw", 3, prefix="2025/").empty
+
+def test_header_only_blob_is_merged_with_the_others(blob_storage):
+    blob_storage("raw", "day-1.csv", HEADER)
+    blob_storage("raw", "day-2.csv", HEADER + "a,France,Beach,10,3.0,1.0,Yes\nb,France,Urban,20,5.0,2.0,No\n")
+
+    table = summary_table("raw")
+    assert table['Country'].tolist() == ['France']
+    assert table['count'].tolist() == [2]
+    assert table['average_rating'].tolist() == [4.0]
+    assert table['total_visitors'].tolist() == [30]
\ No newline at end of file
@@ -0,0 +1,66 @@
+from tourism_schema import read_tourism_csv_raw
+from validation import validate_chunks
+import pandas as pd
+import io
+import pytest
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+
+def good_row(i):
+    return f"loc{i},Country{i % 3},Nature,{100 + i},{1 + i % 4}.5,{i}.25,{'Yes' if i % 2 else 'No'}\n"
+
+def raw_chunks(lines, chunksize):
+    return read_tourism_csv_raw(io.StringIO(HEADER + "".join(lines)), chunksize=chunksize)
+
+def test_invalid_rows_are_quarantined_and_clean_rows_typed():
+    lines = [good_row(i) for i in range(8)]
+    lines[1] = "loc1,Country1,Nature,101,abc,1.25,Yes\n"
+    lines[2] = "loc2,Country2,Nature,1.5,7.0,2.25,Maybe\n"
+    lines[5] = "loc5,,Nature,105,2.5,-1,No\n"
+    lines[6] = "loc6,Country0,Nature,,2.5,6.25,No\n"
+    quarantine = []
+
+    clean = pd.concat(validate_chunks(raw_chunks(lines, 4), quarantine, max_invalid_fraction=None), ignore_index=True)
+
+    assert clean['Location'].tolist() == ["loc0", "loc3", "loc4", "loc7"]
+    assert clean['Rating'].tolist() == [1.5, 4.5, 1.5, 4.5]
+    assert clean['Visitors'].dtype == 'uint32'
+    assert clean['Accommodation_Available'].dtype == 'bool'
+    invalid = pd.concat(quarantine, ignore_index=True)
+    assert invalid['row'].tolist() == [2, 3, 6, 7]
+    assert invalid['reason'].tolist() == [
+        "Rating not numeric",
+        "Rating out of range; Visitors not numeric; Accommodation_Available not Yes/No",
+        "Country missing; Revenue out of range",
+        "Visitors missing",
+    ]
+
+def test_early_invalid_rows_do_not_fail_a_file_that_is_fine_overall():
+    lines = [good_row(i) for i in range(400)]
+    lines[0] = "loc0,Country0,Nature,100,abc,0.25,No\n"
+    lines[1] = "loc1,Country1,Nature,101,abc,1.25,Yes\n"
+    quarantine = []
+
+    clean = list(validate_chunks(raw_chunks(lines, 10), quarantine, max_invalid_fraction=0.01))
+
+    assert sum(len(chunk) for chunk in clean) == 398
+
+def test_too_many_invalid_rows_fail_once_the_input_is_read():
+    lines = [good_row(i) for i in range(100)]
+    lines[50] = "loc50,Country2,Nature,150,abc,50.25,No\n"
+    lines[60] = "loc60,Country0,Nature,160,abc,60.25,No\n"
+    chunks = validate_chunks(raw_chunks(lines, 10), [], max_invalid_fraction=0.01)
+
+    assert sum(len(next(chunks)) for _ in range(10)) == 98
+    with pytest.raises(ValueError, match="2 of 100 rows are invalid"):
+        next(chunks)
+
+def test_known_total_fails_as_soon_as_the_limit_is_exceeded():
+    lines = [good_row(i) for i in range(100)]
+    lines[3] = "loc3,Country0,Nature,103,abc,3.25,No\n"
+    lines[13] = "loc13,Country1,Nature,113,abc,13.25,No\n"
+    chunks = validate_chunks(raw_chunks(lines, 10), [], max_invalid_fraction=0.01, total_rows=100)
+
+    next(chunks)
+    with pytest.raises(ValueError, match="2 invalid rows after 20"):
+        next(chunks)
\ No newline at end of file
@@ -0,0 +1,29 @@
+from tourism_schema import read_tourism_csv
+from vectorized_aggregation import aggregate_metrics
+import pandas as pd
+import io
+
+CSV = (
+    "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+    "a,France,Beach,10,4.5,1.5,Yes\n"
+    "b,Egypt,Urban,20,2.0,2.25,No\n"
+    "c,France,Nature,30,3.5,,Yes\n"
+    "d,Brazil,Urban,40,,4.0,No\n"
+)
+
+def test_typed_input_gives_the_baseline_groupby_output():
+    typed = read_tourism_csv(io.StringIO(CSV))
+    inferred = pd.read_csv(io.StringIO(CSV))
+    expected = inferred.groupby('Country')['Rating'].mean().reset_index().rename(columns={'Rating': 'average_rating'})
+
+    assert aggregate_metrics(typed, by=['Country'], metrics={'average_rating': ('Rating', 'mean')}).equals(expected)
+
+def test_integer_sums_stay_integer():
+    typed = read_tourism_csv(io.StringIO(CSV))
+
+    result = aggregate_metrics(typed, by=['Country', 'Category'], metrics={'visitors': ('Visitors', 'sum'), 'revenue': ('Revenue', 'sum')})
+
+    assert result['visitors'].dtype == 'int64'
+    assert result['visitors'].tolist() == [40, 20, 10, 30]
+    assert result['revenue'].dtype == 'float64'
+    assert result['Category'].dtype == pd.read_csv(io.StringIO(CSV))['Category'].dtype
\ No newline at end of file
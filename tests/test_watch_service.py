@@ -0,0 +1,85 @@
+from azure_clients import get_blob_service_client
+from load_analyze_write_upload import load_blob_chunks, upload_to_azure_storage
+from watch_service import BLOB_MAX_ATTEMPTS, RESULT_BLOB, RESULT_CONTAINER, RawContainerWatcher
+import watch_service
+import pandas as pd
+import io
+import os
+import pytest
+
+HEADER = "Location,Country,Category,Visitors,Rating,Revenue,Accommodation_Available\n"
+
+def published(storage_root):
+    with open(os.path.join(storage_root, RESULT_CONTAINER, RESULT_BLOB), "rb") as file:
+        return pd.read_csv(io.BytesIO(file.read()))
+
+def test_empty_container_publishes_an_empty_result(blob_storage, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    get_blob_service_client().get_container_client("raw").create_container()
+    watcher = RawContainerWatcher()
+
+    assert watcher.refresh()
+    assert watcher.published.empty
+    assert list(published(tmp_path / "storage").columns) == ['Country', 'average_rating']
+    assert not watcher.refresh()
+
+def test_result_follows_new_and_removed_blobs(blob_storage, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    blob_storage("raw", "day-1.csv", HEADER + "a,France,Beach,10,3.0,1.0,Yes\nb,Egypt,Urban,20,2.0,1.0,No\n")
+    watcher = RawContainerWatcher(n_top=1)
+
+    assert watcher.refresh()
+    assert watcher.published['Country'].tolist() == ['France']
+    assert not watcher.refresh()
+
+    blob_storage("raw", "day-2.csv", HEADER + "c,Egypt,Urban,20,5.0,1.0,No\nd,Egypt,Urban,20,5.0,1.0,No\n")
+    assert watcher.refresh()
+    assert published(tmp_path / "storage")['Country'].tolist() == ['Egypt']
+
+    for blob_name in ("day-1.csv", "day-2.csv"):
+        get_blob_service_client().get_blob_client("raw", blob_name).delete_blob()
+    assert watcher.refresh()
+    assert published(tmp_path / "storage").empty
+def test_failed_publish_is_retried(blob_storage, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    blob_storage("raw", "day-1.csv", HEADER + "a,France,Beach,10,3.0,1.0,Yes\n")
+    uploads = []
+
+    def flaky_upload(container_name, blob_name, local_path):
+        uploads.append(blob_name)
+        if len(uploads) == 1:
+            raise RuntimeError("Connection reset")
+        upload_to_azure_storage(container_name, blob_name, local_path)
+    monkeypatch.setattr(watch_service, 'upload_to_azure_storage', flaky_upload)
+    watcher = RawContainerWatcher()
+
+    with pytest.raises(RuntimeError):
+        watcher.refresh()
+    # Nothing changed in the container, the result still has to be published
+    assert watcher.refresh()
+    assert published(tmp_path / "storage")['Country'].tolist() == ['France']
+    assert not watcher.refresh()
+    assert len(uploads) == 2
+
+def test_malformed_blob_is_skipped_then_quarantined(blob_storage, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    blob_storage("raw", "day-1.csv", HEADER + "a,France,Beach,10,3.0,1.0,Yes\n")
+    blob_storage("raw", "day-2.csv", HEADER + "b,Egypt,Urban,20,not a rating,1.0,No\n")
+    reads = []
+
+    def counting_load(container_name, blob_name, **kwargs):
+        reads.append(blob_name)
+        return load_blob_chunks(container_name, blob_name, **kwargs)
+    monkeypatch.setattr(watch_service, 'load_blob_chunks', counting_load)
+    watcher = RawContainerWatcher()
+
+    assert watcher.refresh()
+    assert published(tmp_path / "storage")['Country'].tolist() == ['France']
+    for _ in range(BLOB_MAX_ATTEMPTS + 2):
+        assert not watcher.refresh()
+    assert reads.count("day-2.csv") == BLOB_MAX_ATTEMPTS
+
+    # A fixed version of the blob is read again
+    blob_storage("raw", "day-2.csv", HEADER + "b,Egypt,Urban,20,5.0,1.0,No\n")
+    assert watcher.refresh()
+    assert published(tmp_path / "storage")['Country'].tolist() == ['Egypt', 'France']
\ No newline at end of file
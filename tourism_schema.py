@@ -0,0 +1,52 @@
+import pandas as pd
+
+# Explicit schema for tourism_dataset.csv, applied at parse time instead of letting pd.read_csv infer it.
+# Country/Category have a handful of values, so categoricals store them as small integer codes.
+# Rating and Revenue stay float64: float32 would change the averages and lose Revenue's cents.
+# Visitors and the flag use plain numpy types, as the nullable UInt32/boolean parse is several times
+# slower. A missing value in them fails this parse; validation.py reads such files and quarantines those rows.
+TOURISM_DTYPES = {
+    'Location': 'str',
+    'Country': 'category',
+    'Category': 'category',
+    'Visitors': 'uint32',
+    'Rating': 'float64',
+    'Revenue': 'float64',
+    'Accommodation_Available': 'bool',
+}
+TRUE_VALUES = ['Yes']
+FALSE_VALUES = ['No']
+
+# Columns needed when aggregate_data is the only consumer
+AGGREGATE_COLUMNS = ['Country', 'Rating']
+
+def aggregate_columns(by='Country', column='Rating'):
+    return list(dict.fromkeys([by, column]))
+
+def tourism_dtypes(usecols=None):
+    return {column: dtype for column, dtype in TOURISM_DTYPES.items() if usecols is None or column in usecols}
+
+def read_tourism_csv(source, usecols=None, **kwargs):
+    return pd.read_csv(
+        source,
+        usecols=usecols,
+        dtype=tourism_dtypes(usecols),
+        true_values=TRUE_VALUES,
+        false_values=FALSE_VALUES,
+        **kwargs,
+    )
+
+# Raw variant for validation.py, where a malformed value must reach the validator instead of failing
+# the parse. The flag column is kept as text. The measure columns are left to the parser's inference:
+# a clean chunk comes out numeric straight away, and a malformed value only turns its own chunk's
+# column into text (object dtype) for the validator to parse.
+RAW_TEXT_COLUMNS = ['Location', 'Accommodation_Available']
+RAW_INFERRED_COLUMNS = ['Visitors', 'Rating', 'Revenue']
+
+def read_tourism_csv_raw(source, usecols=None, **kwargs):
+    dtypes = {
+        column: 'str' if column in RAW_TEXT_COLUMNS else dtype
+        for column, dtype in tourism_dtypes(usecols).items() if column not in RAW_INFERRED_COLUMNS
+    }
+    # low_memory=False: one inferred type per column and chunk, never a mix of numbers and text
+    return pd.read_csv(source, usecols=usecols, dtype=dtypes, low_memory=False, **kwargs)
\ No newline at end of file
@@ -0,0 +1,148 @@
+from aggregation import aggregate_chunks, top_n_from_state
+from load_analyze_write_upload import load_blob_chunks, upload_dataframe_to_azure_storage
+from blob_stream import DEFAULT_CHUNKSIZE
+from instrumentation import annotate, stage
+from tourism_schema import AGGREGATE_COLUMNS, FALSE_VALUES, TRUE_VALUES, read_tourism_csv_raw
+import numpy as np
+import pandas as pd
+import os
+
+# Chunk-wise validation of tourism_dataset.csv: every rule is a vectorized check over a whole chunk
+# that sets one bit of a per-row mask, so clean rows never go through Python code one by one.
+# Invalid rows (raw text, row number and reason) go to a quarantine blob, clean rows come out typed.
+QUARANTINE_CONTAINER = "quarantine"
+# Fail the run when more than this fraction of rows is invalid (a broken file rather than a few bad records)
+MAX_INVALID_FRACTION = float(os.environ.get('data_engineer_test_max_invalid_fraction', '0.01'))
+
+REQUIRED_TEXT_COLUMNS = ['Location', 'Country', 'Category']
+# column -> (pandas dtype after validation, min, max, integer only, may be missing)
+NUMERIC_RULES = {
+    'Rating': ('float64', 1.0, 5.0, False, False),
+    'Visitors': ('uint32', 0, np.iinfo('uint32').max, True, False),
+    'Revenue': ('float64', 0.0, np.inf, False, True),
+}
+BOOLEAN_COLUMNS = ['Accommodation_Available']
+
+# One bit per failed rule, turned into text only for the rows that are quarantined
+RULE_REASONS = []
+
+def rule_bit(reason):
+    RULE_REASONS.append(reason)
+    return 1 << (len(RULE_REASONS) - 1)
+
+RULE_BITS = {}
+for column in REQUIRED_TEXT_COLUMNS:
+    RULE_BITS[column, 'missing'] = rule_bit(f"{column} missing")
+for column in NUMERIC_RULES:
+    RULE_BITS[column, 'missing'] = rule_bit(f"{column} missing")
+    RULE_BITS[column, 'type'] = rule_bit(f"{column} not numeric")
+    RULE_BITS[column, 'range'] = rule_bit(f"{column} out of range")
+for column in BOOLEAN_COLUMNS:
+    RULE_BITS[column, 'type'] = rule_bit(f"{column} not {'/'.join(TRUE_VALUES + FALSE_VALUES)}")
+
+def reasons_from_mask(mask):
+    # Only called for the invalid rows, so a Python loop is fine here
+    return ['; '.join(reason for bit, reason in enumerate(RULE_REASONS) if row_mask >> bit & 1) for row_mask in mask.tolist()]
+
+def parse_numbers(values):
+    # A column the parser already typed is used as it is. Only a column where it met a non-numeric
+    # value (object dtype) goes through the coercing text parse, which turns the bad cells into NaN.
+    if pd.api.types.is_bool_dtype(values):
+        # Inferred from True/False text, which is not a number
+        return np.full(len(values), np.nan)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype='float64', na_value=np.nan)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+def flag(mask, hit, column, rule):
+    mask[hit] |= RULE_BITS[column, rule]
+
+def validate_chunk(raw):
+    # raw: one chunk from read_tourism_csv_raw. Returns the clean rows with TOURISM_DTYPES and the
+    # invalid raw rows (row number within the chunk, reason) or None.
+    mask = np.zeros(len(raw), dtype='uint32')
+    parsed = {}
+    for column in raw.columns:
+        missing = raw[column].isna().to_numpy()
+        if column in NUMERIC_RULES:
+            _, low, high, integer_only, optional = NUMERIC_RULES[column]
+            numbers = parse_numbers(raw[column])
+            not_numeric = np.isnan(numbers) & ~missing
+            if integer_only:
+                not_numeric |= np.isfinite(numbers) & (numbers != np.floor(numbers))
+            flag(mask, not_numeric, column, 'type')
+            # NaN compares False, so missing values are never out of range
+            flag(mask, (numbers < low) | (numbers > high), column, 'range')
+            if not optional:
+                flag(mask, missing, column, 'missing')
+            parsed[column] = numbers
+        elif column in BOOLEAN_COLUMNS:
+            is_true = raw[column].isin(TRUE_VALUES).to_numpy()
+            flag(mask, ~(is_true | raw[column].isin(FALSE_VALUES).to_numpy()), column, 'type')
+            parsed[column] = is_true
+        elif column in REQUIRED_TEXT_COLUMNS:
+            flag(mask, missing, column, 'missing')
+
+    valid = mask == 0
+    if valid.all():
+        clean, invalid = raw.copy(), None
+    else:
+        clean = raw[valid].copy()
+        invalid = raw[~valid].copy()
+        invalid.insert(0, 'reason', reasons_from_mask(mask[~valid]))
+        invalid.insert(0, 'row', np.flatnonzero(~valid) + 1)
+        parsed = {column: values[valid] for column, values in parsed.items()}
+
+    for column, values in parsed.items():
+        dtype = NUMERIC_RULES[column][0] if column in NUMERIC_RULES else 'bool'
+        clean[column] = values.astype(dtype, copy=False)
+    return clean, invalid
+
+def validate_chunks(chunks, quarantine, max_invalid_fraction=MAX_INVALID_FRACTION, total_rows=None):
+    # Yields clean typed chunks and appends the invalid rows (with their 1-based data row number) to
+    # `quarantine`. Fails after the last chunk when more than max_invalid_fraction of all rows are
+    # invalid, so a few bad rows at the start do not fail a file that is fine overall. With total_rows
+    # known (e.g. from a previous run), it fails as soon as the invalid rows alone exceed that share.
+    rows = 0
+    invalid_rows = 0
+    for raw in chunks:
+        with stage("validate"):
+            clean, invalid = validate_chunk(raw)
+            annotate(rows=len(raw))
+        if invalid is not None:
+            invalid['row'] += rows
+            quarantine.append(invalid.reset_index(drop=True))
+            invalid_rows += len(invalid)
+        rows += len(raw)
+        if max_invalid_fraction is not None and total_rows is not None and invalid_rows > max_invalid_fraction * max(total_rows, rows):
+            raise ValueError(f"{invalid_rows} invalid rows after {rows} of about {total_rows} rows (more than {max_invalid_fraction:.1%}).")
+        yield clean.reset_index(drop=True)
+
+    if max_invalid_fraction is not None and invalid_rows > max_invalid_fraction * rows:
+        raise ValueError(f"{invalid_rows} of {rows} rows are invalid (more than {max_invalid_fraction:.1%}).")
+
+def quarantine_blob_name(blob_name):
+    return os.path.splitext(blob_name)[0] + '.quarantine.csv'
+
+def load_blob_validated(container_name, blob_name, chunksize=DEFAULT_CHUNKSIZE, save_local_path=None, usecols=None,
+                        max_invalid_fraction=MAX_INVALID_FRACTION, total_rows=None):
+    # Like load_blob_chunks, but every chunk is validated first. Once the blob is consumed, the
+    # quarantined rows (if any) are uploaded to QUARANTINE_CONTAINER/<blob>.quarantine.csv.
+    # The quarantine is also uploaded when the run fails on too many invalid rows, to see why.
+    # total_rows: expected row count, if known, to fail early on a broken file (see validate_chunks)
+    quarantine = []
+    chunks = load_blob_chunks(container_name, blob_name, chunksize=chunksize, save_local_path=save_local_path,
+                              usecols=usecols, reader=read_tourism_csv_raw)
+    try:
+        yield from validate_chunks(chunks, quarantine, max_invalid_fraction=max_invalid_fraction, total_rows=total_rows)
+    finally:
+        if quarantine:
+            quarantined = pd.concat(quarantine, ignore_index=True)
+            upload_dataframe_to_azure_storage(quarantined, container_name=QUARANTINE_CONTAINER, blob_name=quarantine_blob_name(blob_name))
+            print(f"{len(quarantined)} invalid rows of '{blob_name}' quarantined as '{QUARANTINE_CONTAINER}/{quarantine_blob_name(blob_name)}'.")
+
+if __name__ == "__main__":
+    # Same aggregation as load_analyze_write_upload.py, on validated rows only
+    chunks = load_blob_validated(container_name="raw", blob_name="tourism_dataset.csv", usecols=AGGREGATE_COLUMNS)
+    top_countries = top_n_from_state(aggregate_chunks(chunks), 3)
+    upload_dataframe_to_azure_storage(top_countries, container_name="anastasios-iliopoulos", blob_name="Anastasios-Iliopoulos/Anastasios-Iliopoulos.csv")
\ No newline at end of file
@@ -0,0 +1,155 @@
+from aggregation import compensated_add, split_for_exact_sum
+import numpy as np
+import pandas as pd
+
+# Declarative group-by: several keys and several metrics computed from one factorization of the
+# keys, with np.bincount for count/sum/mean/share and ufunc.at scatters for min/max.
+# Sums use the same exact splitting as aggregation.py: correctly rounded, which on tourism_dataset.csv
+# gives exactly pandas' groupby().mean() (pandas' compensated sum can be an ulp off on other data).
+METRIC_OPS = ('count', 'sum', 'mean', 'min', 'max', 'share')
+
+# Example request: the dashboard metrics per Country and Category
+DASHBOARD_METRICS = {
+    'locations': ('Location', 'count'),
+    'average_rating': ('Rating', 'mean'),
+    'min_rating': ('Rating', 'min'),
+    'max_rating': ('Rating', 'max'),
+    'total_visitors': ('Visitors', 'sum'),
+    'average_visitors': ('Visitors', 'mean'),
+    'max_visitors': ('Visitors', 'max'),
+    'total_revenue': ('Revenue', 'sum'),
+    'average_revenue': ('Revenue', 'mean'),
+    'min_revenue': ('Revenue', 'min'),
+    'max_revenue': ('Revenue', 'max'),
+    'accommodation_share': ('Accommodation_Available', 'share'),
+}
+
+# Rows per block when splitting values for exact sums: small enough for the buffers to stay in cache
+SUM_BLOCK_ROWS = 1 << 16
+
+def factorize_key(values):
+    # Categorical keys already are integer codes in category order (groupby's order for them)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = pd.Categorical.from_codes(np.arange(len(values.cat.categories)), dtype=values.dtype)
+        return values.cat.codes.to_numpy().astype('int64'), categories
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype('int64'), uniques
+
+def group_key_values(key_uniques, codes_per_group):
+    # Categorical keys come back in their categories' dtype, like the plain column the baseline parsed
+    values = key_uniques.take(codes_per_group)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.categories.dtype)
+    return values
+
+def dense_ids(combined, size):
+    # Renumbers ids in [0, size) to 0..n_groups-1 keeping their order; also returns the original
+    # id of every group
+    if size <= max(len(combined), 1 << 20):
+        present = np.bincount(combined, minlength=size) > 0
+        return (np.cumsum(present) - 1)[combined], np.flatnonzero(present)
+    ids, uniques = pd.factorize(combined, sort=True)
+    return ids, uniques
+
+def group_ids(df, by):
+    # Dense group id per row, numbered in sorted (lexicographic) key order like groupby(sort=True),
+    # plus the code of every key for every group.
+    # Rows with a missing key are left out (keep is False for them), like groupby(dropna=True).
+    factorized = [factorize_key(df[key]) for key in by]
+    keep = np.logical_and.reduce([key_codes >= 0 for key_codes, _ in factorized])
+    codes = [key_codes if keep.all() else key_codes[keep] for key_codes, _ in factorized]
+    uniques = [key_uniques for _, key_uniques in factorized]
+
+    # Mixed radix keeps the order; renumbering after every key keeps the ids dense so they cannot overflow
+    ids, group_codes = dense_ids(codes[0], len(uniques[0]))
+    group_keys = [group_codes]
+    for key_codes, key_uniques in zip(codes[1:], uniques[1:]):
+        ids, group_codes = dense_ids(ids * len(key_uniques) + key_codes, len(group_keys[0]) * len(key_uniques))
+        previous_groups, key_group_codes = np.divmod(group_codes, len(key_uniques))
+        group_keys = [codes_per_group[previous_groups] for codes_per_group in group_keys] + [key_group_codes]
+    return ids, keep, group_keys, uniques
+
+def metric_values(df, column):
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+        # Only 'count' makes sense on text: 1.0 for present, NaN for missing
+        return np.where(values.isna().to_numpy(), np.nan, 1.0)
+    return values.to_numpy(dtype='float64', na_value=np.nan)
+
+def exact_group_sums(ids, values, n_groups):
+    # Same split as aggregation.split_for_exact_sum (high parts on one grid for the whole column, so
+    # their per-group sums are exact), but done block by block in reused cache-sized buffers
+    # instead of materializing two more full-length arrays.
+    magnitude = max(values.max(), -values.min()) if len(values) else 0.0
+    if magnitude == 0.0 or not np.isfinite(magnitude):
+        high, low = split_for_exact_sum(values)
+        high_sums = np.bincount(ids, weights=high, minlength=n_groups)
+        low_sums = np.bincount(ids, weights=low, minlength=n_groups)
+    else:
+        grid = 2.0 ** (np.ceil(np.log2(magnitude * len(values))) - 52)
+        block_rows = max(SUM_BLOCK_ROWS, 4 * n_groups)
+        high = np.empty(min(block_rows, len(values)))
+        low = np.empty_like(high)
+        high_sums = np.zeros(n_groups)
+        low_sums = np.zeros(n_groups)
+        for start in range(0, len(values), block_rows):
+            block = values[start:start + block_rows]
+            block_high = high[:len(block)]
+            block_low = low[:len(block)]
+            np.multiply(block, 1.0 / grid, out=block_high)
+            np.rint(block_high, out=block_high)
+            block_high *= grid
+            np.subtract(block, block_high, out=block_low)
+            high_sums += np.bincount(ids[start:start + block_rows], weights=block_high, minlength=n_groups)
+            low_sums += np.bincount(ids[start:start + block_rows], weights=block_low, minlength=n_groups)
+    sums, errors = compensated_add(high_sums, 0.0, low_sums, 0.0)
+    return sums + errors
+
+def aggregate_metrics(df, by=('Country',), metrics=None):
+    # metrics maps output column -> (input column, op), e.g. {'average_rating': ('Rating', 'mean')}.
+    # Returns one row per group sorted by the keys, with a RangeIndex, like groupby().agg().reset_index().
+    by = [by] if isinstance(by, str) else list(by)
+    metrics = metrics or {'average_rating': ('Rating', 'mean')}
+    unknown = {op for _, op in metrics.values()} - set(METRIC_OPS)
+    if unknown:
+        raise ValueError(f"Unsupported metric ops: {sorted(unknown)}. Choose from {METRIC_OPS}.")
+
+    ids, keep, group_keys, uniques = group_ids(df, by)
+    n_groups = len(group_keys[0])
+    result = {key: group_key_values(key_uniques, codes_per_group) for key, key_uniques, codes_per_group in zip(by, uniques, group_keys)}
+
+    # Per input column: valid mask, group ids of the valid rows, counts and exact sums, each
+    # computed once however many metrics use them
+    cache = {}
+    def column_cache(column):
+        if column not in cache:
+            values = metric_values(df, column)
+            values = values if keep.all() else values[keep]
+            valid = ~np.isnan(values)
+            cache[column] = {'values': values, 'ids': ids if valid.all() else ids[valid], 'valid': valid}
+        return cache[column]
+
+    for name, (column, op) in metrics.items():
+        entry = column_cache(column)
+        if op in ('count', 'mean', 'share') and 'counts' not in entry:
+            entry['counts'] = np.bincount(entry['ids'], minlength=n_groups)
+        if op in ('sum', 'mean', 'share') and 'sums' not in entry:
+            valid_values = entry['values'] if len(entry['ids']) == len(ids) else entry['values'][entry['valid']]
+            entry['sums'] = exact_group_sums(entry['ids'], valid_values, n_groups)
+
+        if op == 'count':
+            result[name] = entry['counts']
+        elif op == 'sum':
+            # Integer columns keep integer sums; the exact float sums are whole numbers (below 2**53)
+            result[name] = np.rint(entry['sums']).astype('int64') if pd.api.types.is_integer_dtype(df[column].dtype) else entry['sums']
+        elif op in ('mean', 'share'):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[name] = entry['sums'] / np.where(entry['counts'] > 0, entry['counts'], np.nan)
+        else:
+            # Unbuffered scatter into a NaN-initialized array: fmin/fmax skip NaN, so a group with
+            # only missing values stays NaN. Cheaper than sorting the rows by group for ufunc.reduceat.
+            reduce = np.fmin if op == 'min' else np.fmax
+            result[name] = np.full(n_groups, np.nan)
+            reduce.at(result[name], ids, entry['values'])
+
+    return pd.DataFrame(result)
\ No newline at end of file
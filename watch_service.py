@@ -0,0 +1,163 @@
+from azure_clients import get_blob_service_client, get_credential
+from aggregation import aggregate_chunks, empty_state, merge_all, top_n_from_state
+from instrumentation import annotate, stage
+from load_analyze_write_upload import load_blob_chunks, upload_to_azure_storage, write_to_csv
+from tourism_schema import aggregate_columns
+import threading
+import signal
+import time
+import os
+import traceback
+
+# Resident variant of load_analyze_write_upload.py: one interpreter, one credential and one pooled
+# BlobServiceClient for the whole lifetime, and a partial aggregation state per raw blob kept in
+# memory by ETag. A new or changed blob costs one pass over that blob, a poll with no changes one
+# list call, and the top-N result is only written and uploaded when it is different.
+RAW_CONTAINER = "raw"
+RESULT_CONTAINER = "anastasios-iliopoulos"
+RESULT_BLOB = "Anastasios-Iliopoulos/Anastasios-Iliopoulos.csv"
+LOCAL_RESULT_PATH = "./Anastasios-Iliopoulos.csv"
+N_TOP = 3
+# Seconds between two listings of the raw container
+POLL_INTERVAL = float(os.environ.get('data_engineer_test_watch_poll_interval', '5'))
+# Optional Storage queue fed by an Event Grid subscription on BlobCreated/BlobDeleted of the raw
+# container: a message triggers a scan right away, the listing stays the source of truth
+QUEUE_NAME = os.environ.get('data_engineer_test_watch_queue')
+# Seconds between two reads of the queue
+QUEUE_POLL_INTERVAL = 1.0
+# Failed reads of the same blob version before it is quarantined (skipped until its ETag changes)
+BLOB_MAX_ATTEMPTS = 3
+
+class RawContainerWatcher:
+    def __init__(self, container_name=RAW_CONTAINER, prefix="", n_top=N_TOP, by='Country'):
+        self.container_name = container_name
+        self.prefix = prefix
+        self.n_top = n_top
+        self.by = by
+        # blob name -> (etag, partial state)
+        self.states = {}
+        # blob name -> (etag, failed reads of that version)
+        self.failures = {}
+        self.published = None
+        # Set when the states changed and cleared only once the result is uploaded (or unchanged)
+        self.dirty = True
+
+    def list_blobs(self):
+        container_client = get_blob_service_client().get_container_client(self.container_name)
+        return {blob.name: blob.etag for blob in container_client.list_blobs(name_starts_with=self.prefix) if blob.name.endswith('.csv')}
+
+    def is_quarantined(self, blob_name, etag):
+        return self.failures.get(blob_name) == (etag, BLOB_MAX_ATTEMPTS)
+
+    def scan(self):
+        # Brings the per-blob states in line with the container; True if anything changed. A blob
+        # that cannot be read is left out of the result instead of failing the whole scan.
+        current = self.list_blobs()
+        changed = [
+            blob_name for blob_name, etag in current.items()
+            if self.states.get(blob_name, (None,))[0] != etag and not self.is_quarantined(blob_name, etag)
+        ]
+        removed = [blob_name for blob_name in self.states if blob_name not in current]
+        self.failures = {blob_name: failure for blob_name, failure in self.failures.items() if current.get(blob_name) == failure[0]}
+
+        for blob_name in removed:
+            del self.states[blob_name]
+        failed = []
+        for blob_name in changed:
+            try:
+                with stage("watch_blob"):
+                    chunks = load_blob_chunks(self.container_name, blob_name, usecols=aggregate_columns(self.by))
+                    self.states[blob_name] = (current[blob_name], aggregate_chunks(chunks, by=self.by))
+                self.failures.pop(blob_name, None)
+            except Exception:
+                error_message = traceback.format_exc()
+                print(f"An error occurred while reading '{self.container_name}/{blob_name}':")
+                print(error_message)
+                # The previous version of the blob is no longer in the container either
+                self.states.pop(blob_name, None)
+                attempts = self.failures.get(blob_name, (None, 0))[1] + 1
+                self.failures[blob_name] = (current[blob_name], attempts)
+                if attempts == BLOB_MAX_ATTEMPTS:
+                    print(f"'{self.container_name}/{blob_name}' failed {attempts} times, skipping it until it changes.")
+                failed.append(blob_name)
+        if changed or removed:
+            print(f"'{self.container_name}/{self.prefix}': {len(changed)} new or changed ({len(failed)} failed), {len(removed)} removed, {len(self.states)} blobs.")
+            self.dirty = True
+        return bool(changed or removed)
+
+    def result(self):
+        # Merging the partial states is O(blobs x groups), no raw data is read. No blobs (yet): an
+        # empty result is published, so a container emptied since the last result does not keep it.
+        state = merge_all(state for _, state in self.states.values())
+        return top_n_from_state(state if state is not None else empty_state(self.by), self.n_top, by=self.by)
+
+    def refresh(self):
+        # Returns True when a new result was published. A failed upload leaves the watcher dirty,
+        # so the next refresh publishes again even if the container did not change.
+        self.scan()
+        if not self.dirty:
+            return False
+        top = self.result()
+        if self.published is not None and top.equals(self.published):
+            self.dirty = False
+            return False
+
+        with stage("watch_publish"):
+            upload_to_azure_storage(RESULT_CONTAINER, RESULT_BLOB, write_to_csv(top, LOCAL_RESULT_PATH))
+            annotate(rows=len(top))
+        self.published = top
+        self.dirty = False
+        return True
+
+def get_queue_client(queue_name):
+    # Imported here: the queue is optional and only needed in the watch mode
+    from azure.storage.queue import QueueClient
+    account_name = os.environ['data_engineer_test_storage_account']
+    return QueueClient(account_url=f"https://{account_name}.queue.core.windows.net", queue_name=queue_name, credential=get_credential())
+
+def drain_queue(queue_client):
+    # Event contents are not needed, the scan lists the container anyway
+    received = 0
+    for message in queue_client.receive_messages(messages_per_page=32):
+        queue_client.delete_message(message)
+        received += 1
+    return received
+
+def watch(watcher, stop_event, poll_interval=POLL_INTERVAL, queue_client=None):
+    # Runs until stop_event is set; a failed refresh is reported and retried on the next poll
+    next_scan = 0.0
+    while not stop_event.is_set():
+        if queue_client is not None and time.monotonic() < next_scan:
+            try:
+                if drain_queue(queue_client):
+                    next_scan = 0.0
+            except Exception:
+                error_message = traceback.format_exc()
+                print(f"An error occurred while reading the queue:")
+                print(error_message)
+
+        if time.monotonic() >= next_scan:
+            try:
+                watcher.refresh()
+            except Exception:
+                error_message = traceback.format_exc()
+                print(f"An error occurred:")
+                print(error_message)
+                # Logging in production
+            next_scan = time.monotonic() + poll_interval
+
+        stop_event.wait(QUEUE_POLL_INTERVAL if queue_client is not None else max(next_scan - time.monotonic(), 0.0))
+
+def stop_on_signals(stop_event):
+    # SIGTERM (systemd, docker stop) and Ctrl+C finish the current refresh, then exit
+    def handler(signum, frame):
+        print(f"Received signal {signum}, stopping after the current refresh.")
+        stop_event.set()
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+if __name__ == "__main__":
+    stop_event = threading.Event()
+    stop_on_signals(stop_event)
+    watch(RawContainerWatcher(), stop_event, queue_client=get_queue_client(QUEUE_NAME) if QUEUE_NAME else None)
+    print("Watcher stopped.")
\ No newline at end of file